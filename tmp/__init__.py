@@ -10,6 +10,11 @@ Use of this source code is governed by a MIT
 license that can be found in the LICENSE file.
 """
 
+__version__ = '0.1.0'
+
 from .node import *
 from .ast_node import *
 from .flowchart import *
+from .incremental import *
+from .cache import *
+from .profiling import *
@@ -7,16 +7,113 @@ license that can be found in the LICENSE file.
 """
 
 import argparse
+import ast
+import codecs
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import sys
+import time
 
-import chardet
+from pyflowchart.ast_node import CollapsedPathError
+from pyflowchart.cache import FlowchartCache, CachedFlowchart
+from pyflowchart.flowchart import Flowchart, FieldIndex
+from pyflowchart.profiling import BuildProfile
 
-from pyflowchart.flowchart import Flowchart
+
+# byte order marks -> encoding (UTF-32 before UTF-16: the UTF-32-LE BOM starts with the UTF-16-LE one)
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# chardet detects the encoding of (non-UTF-8) files on a sample of that many bytes
+DETECT_SAMPLE_BYTES = 16 * 1024
+
+# non-ASCII bytes: their lines are what tells encodings apart
+_NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+
+def _non_ascii_lines(content: bytes):
+    """_non_ascii_lines yields the lines (with their line ends) of content that have non-ASCII bytes.
+
+    Linear in len(content): the lines are found around the non-ASCII bytes,
+    and the search goes on after the line taken.
+    """
+    m = _NON_ASCII.search(content)
+    while m is not None:
+        start = content.rfind(b'\n', 0, m.start()) + 1
+        end = content.find(b'\n', m.end())
+        end = len(content) if end < 0 else end + 1
+        yield content[start:end]
+        m = _NON_ASCII.search(content, end)
 
 
 def detect_decode(file_content: bytes) -> str:
     """detect_decode detect the encoding of file_content,
      then decode file_content on the detected encoding.
 
+    The encoding is, in order:
+
+        1. given by a BOM (UTF-8, UTF-16 or UTF-32);
+        2. declared by a PEP 263 coding cookie (`# -*- coding: gbk -*-`);
+        3. UTF-8, if file_content is valid UTF-8 (as Python 3 codes are by default);
+        4. detected by chardet, on a sample of the lines with non-ASCII bytes
+           (see chardet_decode for the whole content).
+
+    Steps 1-3 are cheap: chardet only reads the files of other encodings, and only a sample of them.
+
+    Args:
+        file_content: bytes: binary file content to decode
+
+    Returns:
+        str: decoded content
+    """
+    for bom, encoding in _BOMS:
+        if file_content.startswith(bom):
+            try:
+                return file_content.decode(encoding)
+            except UnicodeDecodeError:
+                break
+
+    import tokenize  # not needed by cache hits
+
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(file_content).readline)
+    except SyntaxError:  # invalid cookie, or non-UTF-8 first lines without cookie
+        encoding = None
+    if encoding is not None and encoding != 'utf-8':  # a cookie
+        try:
+            return file_content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            pass
+
+    try:
+        return file_content.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+
+    sample = bytearray()
+    for line in _non_ascii_lines(file_content):
+        sample += line
+        if len(sample) >= DETECT_SAMPLE_BYTES:
+            break
+    try:
+        return chardet_decode(file_content, bytes(sample[:DETECT_SAMPLE_BYTES]))
+    except (UnicodeDecodeError, LookupError):  # misled by the sample
+        return chardet_decode(file_content)
+
+
+def chardet_decode(file_content: bytes, sample: bytes = None) -> str:
+    """chardet_decode decodes file_content on the encoding detected by chardet
+    on sample (default: the whole file_content).
+
     If the confidence of detect result is less then 0.9,
     the UTF-8 will be used to decode. PyFlowchart is
     designed to convert Python 3 codes into flowcharts.
@@ -27,12 +124,15 @@ def detect_decode(file_content: bytes) -> str:
 
     Args:
         file_content: bytes: binary file content to decode
+        sample: bytes: part of file_content to detect the encoding on
 
     Returns:
         str: decoded content
     """
+    import chardet  # a heavy import, for the files that are not UTF-8 (nor tell their encoding) only
+
     # detect encoding
-    detect_result = chardet.detect(file_content)
+    detect_result = chardet.detect(file_content if sample is None else sample)
     # print("DEBUG detect_result =", detect_result)
 
     encoding = detect_result.get("encoding")
@@ -50,34 +150,392 @@ def detect_decode(file_content: bytes) -> str:
     return content
 
 
-def main(code_file, field, inner, simplify, conds_align):
+# extension of the flowchart files written into an output directory
+OUTPUT_SUFFIX = '.flowchart'
+# extension of the files of full texts (of elided nodes) written next to them
+TEXTS_SUFFIX = '.texts.json'
+
+
+def main(code_file, field, inner, simplify, conds_align, output=None, cache=None, stable_names=False, profile=None,
+         coalesce=0, max_text_chars=0, max_text_lines=0, full_texts=None, max_depth=0, expand=()):
+    """main converts (the field of) code_file, and writes the flowchart into output (default: stdout).
+
+    Args:
+        output: file, or path of the file to write, opened once the flowchart is built
+        full_texts: file (path) to write the full texts of the elided nodes into, as a JSON object
+            {node name: full text}. Not with a cache: a cache holds the flowcharts only.
+        others: see `Flowchart.from_code`
+    """
     # read file content: binary
     file_content: bytes = code_file.read()
-    # detect encoding and decode file content by detected encoding
-    code = detect_decode(file_content)
 
-    flowchart = Flowchart.from_code(code,
-                                    field=field,
-                                    inner=inner,
-                                    simplify=simplify,
-                                    conds_align=conds_align)
-    print(flowchart.flowchart())
+    # the cache is keyed by the file content (bytes): a hit needs no decoding
+    key = dsl = None
+    if cache is not None:
+        key = cache.key(file_content, field, inner, simplify, conds_align, stable_names, coalesce,
+                        max_text_chars, max_text_lines, max_depth, expand)
+        dsl = cache.get(key)
+
+    if dsl is not None:
+        flowchart = CachedFlowchart(dsl)
+    else:
+        # detect encoding and decode file content by detected encoding
+        code = detect_decode(file_content)
+
+        flowchart = Flowchart.from_code(code,
+                                        field=field,
+                                        inner=inner,
+                                        simplify=simplify,
+                                        conds_align=conds_align,
+                                        stable_names=stable_names,
+                                        profile=profile,
+                                        coalesce=coalesce,
+                                        max_text_chars=max_text_chars,
+                                        max_text_lines=max_text_lines,
+                                        max_depth=max_depth,
+                                        expand=expand)
+        if flowchart.coalesced is not None:
+            print(coalesce_report(*flowchart.coalesced), file=sys.stderr)
+        if full_texts is not None:
+            with open(full_texts, 'w', encoding='utf-8') as f:
+                json.dump(flowchart.full_texts or {}, f, indent=2)
+        if cache is not None:
+            flowchart = CachedFlowchart(flowchart.flowchart())
+            cache.put(key, flowchart.dsl)
+
+    # stream the DSL into output (stdout by default), instead of building the whole string
+    if output is None:
+        output = sys.stdout
+    with open(output, 'w', encoding='utf-8') if isinstance(output, str) else contextlib.nullcontext(output) as output:
+        flowchart.write(output)
+        output.write('\n')
+        output.flush()
+
+
+def coalesce_report(before: int, after: int) -> str:
+    """coalesce_report returns the node-count reduction of the statement coalescing as a line of text"""
+    reduction = (before - after) / before * 100 if before else 0.0
+    return f'coalesce: {before} -> {after} nodes (-{reduction:.1f}%)'
+
+
+def fields_main(code_file, fields, inner, simplify, conds_align, output_dir, stable_names=False, coalesce=0,
+                max_text_chars=0, max_text_lines=0, max_depth=0):
+    """fields_main converts many fields of code_file, parsing it only once,
+    and writes the flowchart of each field into output_dir/<field>.flowchart
+    (and the full texts of its elided nodes into output_dir/<field>.texts.json).
+
+    Args:
+        fields: List[str], fields to convert. None: all functions.
+    """
+    code = detect_decode(code_file.read())
+
+    flowcharts = Flowchart.from_code_fields(code,
+                                            fields=fields,
+                                            inner=inner,
+                                            simplify=simplify,
+                                            conds_align=conds_align,
+                                            stable_names=stable_names,
+                                            coalesce=coalesce,
+                                            max_text_chars=max_text_chars,
+                                            max_text_lines=max_text_lines,
+                                            max_depth=max_depth)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for field, flowchart in flowcharts.items():
+        if flowchart.coalesced is not None:
+            print(f'{field}: {coalesce_report(*flowchart.coalesced)}', file=sys.stderr)
+        with open(os.path.join(output_dir, field + OUTPUT_SUFFIX), 'w', encoding='utf-8') as f:
+            flowchart.write(f)
+            f.write('\n')
+        if flowchart.full_texts:
+            with open(os.path.join(output_dir, field + TEXTS_SUFFIX), 'w', encoding='utf-8') as f:
+                json.dump(flowchart.full_texts, f, indent=2)
+
+
+def find_sources(paths):
+    """find_sources expands the directories and glob patterns given to the batch mode
+    into Python source files.
+
+    A directory is searched recursively for `*.py` files. A glob pattern
+    (or a plain file path) matches files directly.
+
+    Args:
+        paths: directories, files or glob patterns
+
+    Returns:
+        List[Tuple[str, str]]: (source file, output path relative to the output directory without suffix),
+            sorted and deduplicated by source file. Different files may get the same output path
+            (e.g. ../a/x.py and a/x.py), see batch_main.
+    """
+    sources = {}
+    for path in paths:
+        if os.path.isdir(path):
+            root = path
+            files = glob.iglob(os.path.join(glob.escape(path), '**', '*.py'), recursive=True)
+        else:
+            root = os.curdir
+            files = glob.iglob(path, recursive=True)
+
+        for file in files:
+            if not os.path.isfile(file) or file in sources:
+                continue
+            # keep the output inside the output directory: drop the anchor & leading '..' of the relative path
+            rel = os.path.relpath(os.path.abspath(file), os.path.abspath(root))
+            parts = [p for p in rel.split(os.sep) if p not in (os.pardir, os.curdir, '')]
+            sources[file] = os.path.join(*parts)
+
+    return sorted(sources.items())
+
+
+def convert_file(job):
+    """convert_file is the worker of the batch mode: converts one source file
+    and writes the flowchart(s) into the output tree.
+
+    Args:
+        job: (source, target, per_function, inner, simplify, conds_align, stable_names, coalesce,
+              max_text_chars, max_text_lines, max_depth, cache_args),
+            where target is the output path without suffix.
+            With per_function, a flowchart of every function is written into
+            the directory target, named by its field. Otherwise, the flowchart of
+            the whole file is written into target + OUTPUT_SUFFIX.
+            The full texts of elided nodes are written next to each flowchart, with TEXTS_SUFFIX.
+            cache_args: (cache_dir, max_bytes) of a FlowchartCache, or None.
+
+    Returns:
+        (source, number of functions, error message or None, cache statistics or None)
+    """
+    (source, target, per_function, inner, simplify, conds_align, stable_names, coalesce,
+     max_text_chars, max_text_lines, max_depth, cache_args) = job
+    cache = FlowchartCache(*cache_args) if cache_args is not None else None
+    try:
+        with open(source, 'rb') as f:
+            file_content = f.read()
+
+        # a cache entry of the batch mode holds all the outputs of a file:
+        # {"functions": n, "dsl": {field: DSL}, "texts": {field: full texts}}
+        key = entry = None
+        if cache is not None:
+            key = cache.key(file_content, ('--batch', per_function), inner, simplify, conds_align, stable_names,
+                            coalesce, max_text_chars, max_text_lines, max_depth)
+            entry = cache.get(key)
+            if entry is not None:
+                entry = json.loads(entry)
+
+        if entry is None:
+            code = detect_decode(file_content)
+            # one parse per file, whatever the number of functions
+            index = FieldIndex(ast.parse(code))
+            fields = index.functions()
+
+            options = dict(simplify=simplify, conds_align=conds_align, stable_names=stable_names, coalesce=coalesce,
+                           max_text_chars=max_text_chars, max_text_lines=max_text_lines, max_depth=max_depth)
+            if per_function:
+                dsl = {field: index.flowchart(field, inner=inner, **options) for field in fields}
+            else:
+                dsl = {"": index.flowchart("", inner=True, **options)}
+            entry = {"functions": len(fields), "dsl": {field: fc.flowchart() for field, fc in dsl.items()},
+                     "texts": {field: fc.full_texts for field, fc in dsl.items() if fc.full_texts}}
+
+            if cache is not None:
+                cache.put(key, json.dumps(entry))
+
+        for field, dsl in entry["dsl"].items():
+            path = os.path.join(target, field + OUTPUT_SUFFIX) if per_function else target + OUTPUT_SUFFIX
+            os.makedirs(os.path.dirname(path) or os.curdir, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(dsl)
+                f.write('\n')
+            if field in entry["texts"]:
+                with open(path[:-len(OUTPUT_SUFFIX)] + TEXTS_SUFFIX, 'w', encoding='utf-8') as f:
+                    json.dump(entry["texts"][field], f, indent=2)
+
+        error = None
+    except Exception as e:  # report and carry on with other files
+        entry, error = {"functions": 0}, f'{type(e).__name__}: {e}'
+
+    return source, entry["functions"], error, cache.stats() if cache is not None else None
+
+
+def batch_main(paths, output_dir, jobs=None, per_function=False,
+               inner=False, simplify=True, conds_align=False, report=None, cache=None, stable_names=False, coalesce=0,
+               max_text_chars=0, max_text_lines=0, max_depth=0):
+    """batch_main converts all Python files found in paths (see `find_sources`)
+    in a process pool, writing the flowcharts into the output_dir tree.
+
+    Throughput (files/s, functions/s) and failures are reported at the end.
+
+    Args:
+        paths: directories, files or glob patterns
+        output_dir: root of the output tree
+        jobs: number of worker processes (default: os.cpu_count())
+        per_function: write one flowchart per function instead of one per file
+        inner, simplify, conds_align, stable_names, coalesce, max_text_chars, max_text_lines, max_depth:
+            see `Flowchart.from_code`
+        report: file to write the report into (default: stderr)
+        cache: FlowchartCache, its directory is shared by the workers and its statistics count theirs
+
+    Returns:
+        List[Tuple[str, str]]: failures, (source file, error message)
+    """
+    import concurrent.futures  # a heavy import (logging, threading), for --batch only
+
+    if report is None:
+        report = sys.stderr
+
+    sources = find_sources(paths)
+
+    # the first file of an output path is converted, the others are reported instead of overwriting it
+    failures = []
+    targets = {}  # output path -> source file
+    for source, target in sources:
+        if targets.setdefault(target, source) != source:
+            failures.append((source, f'output {target} already written for {targets[target]}'))
+    sources = [(source, target) for source, target in sources if targets[target] == source]
+
+    cache_args = (cache.cache_dir, cache.max_bytes) if cache is not None else None
+    job_list = [(source, os.path.join(output_dir, target), per_function,
+                 inner, simplify, conds_align, stable_names, coalesce, max_text_chars, max_text_lines, max_depth,
+                 cache_args)
+                for source, target in sources]
+
+    n_functions = 0
+
+    t = time.perf_counter()
+    workers = jobs or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        # hand the files out in chunks: a per-file round trip dominates on small files
+        chunksize = max(1, len(job_list) // (workers * 16))
+        for source, functions, error, stats in executor.map(convert_file, job_list, chunksize=chunksize):
+            n_functions += functions
+            if error is not None:
+                failures.append((source, error))
+            for name, count in (stats or {}).items():
+                setattr(cache, name, getattr(cache, name) + count)
+    elapsed = max(time.perf_counter() - t, 1e-9)
+
+    for source, error in failures:
+        print(f'FAILED {source}: {error}', file=report)
+    print(f'{len(sources)} files, {n_functions} functions, {len(failures)} failures '
+          f'in {elapsed:.2f}s with {workers} workers: '
+          f'{len(sources) / elapsed:.1f} files/s, {n_functions / elapsed:.1f} functions/s',
+          file=report)
+    if cache is not None:
+        print(cache.report(), file=report)
+    report.flush()
+
+    return failures
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Python code to flowchart.')
 
     # code_file: open as binary, detect encoding and decode in main later
-    parser.add_argument('code_file', type=argparse.FileType('rb'))
+    parser.add_argument('code_file', nargs='?', type=argparse.FileType('rb'))
 
-    parser.add_argument('-f', '--field', default="", type=str, help="field to draw flowchart. (e.g. Class.method)")
+    parser.add_argument('-f', '--field', action="append", type=str,
+                        help="field to draw flowchart. (e.g. Class.method) "
+                             "Repeat it to draw many fields from one parse, into the output directory -o DIR")
+    parser.add_argument('--all-fields', action="store_true",
+                        help="draw flowcharts of all functions, into the output directory -o DIR")
     parser.add_argument('-i', '--inner', action="store_true", help="parse the body of field")
     parser.add_argument('--no-simplify', action="store_false", help="do not simplify the one-line-body If/Loop")
     parser.add_argument('--conds-align', action="store_true", help="align consecutive If statements")
+    parser.add_argument('--stable-names', action="store_true",
+                        help="name nodes after the position of their statements (e.g. foo.cond3_4), "
+                             "so that the same code always gives the same output")
+    parser.add_argument('--coalesce', default=0, type=int, metavar='N',
+                        help="merge runs of consecutive plain statements into blocks of up to N lines "
+                             "(fewer nodes for huge flowcharts), and report the node-count reduction (into stderr)")
+    parser.add_argument('--max-text-chars', default=0, type=int, metavar='N',
+                        help="elide node texts longer than N characters (default: no limit)")
+    parser.add_argument('--max-text-lines', default=0, type=int, metavar='N',
+                        help="elide node texts of more than N lines (default: no limit)")
+    parser.add_argument('--full-texts', default=None, type=str, metavar='FILE',
+                        help="write the full texts of the elided nodes into FILE (JSON: node name -> text). "
+                             "With an output directory, they are written next to the flowcharts")
+    parser.add_argument('--max-depth', default=0, type=int, metavar='N',
+                        help="collapse the statements with a body (def, class, if, for, while, with, try) nested "
+                             "deeper than N into one summary node each, without building them (default: no limit)")
+    parser.add_argument('--expand', action="append", type=str, metavar='PATH',
+                        help="with --max-depth: build the collapsed statement at PATH anyway (e.g. 0.3.1, "
+                             "as shown in its summary node). Repeat it to expand many")
+    parser.add_argument('-o', '--output', default="-", type=str,
+                        help="file to write the flowchart into (default: stdout). "
+                             "With --batch: the output directory")
+
+    # batch mode
+    parser.add_argument('--batch', nargs='+', metavar='PATH',
+                        help="convert all Python files in the given directories / globs instead of code_file")
+    parser.add_argument('-j', '--jobs', default=None, type=int,
+                        help="number of worker processes of --batch (default: number of CPUs)")
+    parser.add_argument('--per-function', action="store_true",
+                        help="with --batch: write one flowchart per function instead of one per file")
+
+    parser.add_argument('--profile', action="store_true",
+                        help="print the time spent by each stage of the conversion (into stderr)")
+
+    parser.add_argument('--cache-dir', default=None, type=str,
+                        help="directory to cache the flowcharts in, reused by later runs for unchanged files")
+    parser.add_argument('--cache-max-mb', default=64, type=float,
+                        help="size limit of the cache directory in MiB, least recently used entries are evicted")
 
     args = parser.parse_args()
 
-    if not args.field:  # field="", parse the whole file (ast Module), should use the body
+    if args.expand and not args.max_depth:
+        parser.error("--expand requires --max-depth")
+
+    cache = None
+    if args.cache_dir is not None:
+        cache = FlowchartCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 2 ** 20))
+
+    if args.batch:
+        if args.code_file is not None or args.field or args.all_fields:
+            parser.error("--batch converts whole files: code_file and --field are not allowed "
+                         "(use --per-function for all functions)")
+        if args.output == "-":
+            parser.error("--batch requires an output directory: -o DIR")
+        if args.expand:
+            parser.error("--expand paths are relative to one field: not with --batch")
+        failures = batch_main(args.batch, args.output, args.jobs, args.per_function,
+                              args.inner, args.no_simplify, args.conds_align, cache=cache,
+                              stable_names=args.stable_names, coalesce=args.coalesce,
+                              max_text_chars=args.max_text_chars, max_text_lines=args.max_text_lines,
+                              max_depth=args.max_depth)
+        sys.exit(1 if failures else 0)
+
+    if args.code_file is None:
+        parser.error("the following arguments are required: code_file")
+
+    if args.full_texts is not None and cache is not None:
+        parser.error("--full-texts is not available with --cache-dir: the cache holds the flowcharts only")
+
+    if args.all_fields or (args.field and len(args.field) > 1):
+        if args.output == "-":
+            parser.error("many fields require an output directory: -o DIR")
+        if args.expand:
+            parser.error("--expand paths are relative to one field: not with many fields")
+        fields_main(args.code_file, None if args.all_fields else args.field,
+                    args.inner, args.no_simplify, args.conds_align, args.output, args.stable_names, args.coalesce,
+                    args.max_text_chars, args.max_text_lines, args.max_depth)
+        sys.exit(0)
+
+    field = args.field[0] if args.field else ""
+
+    if not field:  # field="", parse the whole file (ast Module), should use the body
         args.inner = True
 
-    main(args.code_file, args.field, args.inner, args.no_simplify, args.conds_align)
+    profile = BuildProfile() if args.profile else None
+
+    try:
+        # the output file is opened once the flowchart is built: not truncated by a bad --expand path
+        main(args.code_file, field, args.inner, args.no_simplify, args.conds_align,
+             None if args.output == "-" else args.output, cache, args.stable_names, profile, args.coalesce,
+             args.max_text_chars, args.max_text_lines, args.full_texts, args.max_depth, args.expand or ())
+    except CollapsedPathError as e:
+        parser.error(f"--expand {e.args[0]}")
+
+    if profile is not None:
+        print(profile.report(), file=sys.stderr)
+
+    if cache is not None:
+        print(cache.report(), file=sys.stderr)
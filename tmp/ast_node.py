@@ -8,11 +8,11 @@ license that can be found in the LICENSE file.
 """
 
 import _ast
+import time
 from typing import List, Tuple
 
-import astunparse
-
 from pyflowchart.node import *
+from pyflowchart.profiling import active_profile
 
 
 # TODO: beautify tail connection direction
@@ -20,23 +20,92 @@ from pyflowchart.node import *
 
 class AstNode(Node):
     """AstNode is nodes from AST
+
+    AstNode is used as a mixin: AstNode.__init__ only sets ast_object,
+    the Node part is initialized by the other (flowchart.js Node) base class.
     """
+    __slots__ = ()
 
     def __init__(self, ast_object: _ast.AST, **kwargs):
-        Node.__init__(self)
         self.ast_object = ast_object
 
     def ast_to_source(self) -> str:
         """
         self.ast_object (_ast.AST) back to Python source code
         """
-        return astunparse.unparse(self.ast_object).strip()
+        return _unparse(self.ast_object).strip()
+
+
+class SourceSpan(object):
+    """
+    SourceSpan is the position of a statement in the source code.
+
+    It replaces the ast_object of AstNodes in lean builds (see release_ast in flowchart.py),
+    so that a built graph does not pin the whole AST.
+    """
+    __slots__ = ('lineno', 'col_offset', 'end_lineno', 'end_col_offset')
+
+    def __init__(self, lineno: int, col_offset: int, end_lineno: int = None, end_col_offset: int = None):
+        self.lineno = lineno
+        self.col_offset = col_offset
+        self.end_lineno = end_lineno
+        self.end_col_offset = end_col_offset
+
+    @staticmethod
+    def of(ast_object: _ast.AST):
+        """of returns the SourceSpan of ast_object"""
+        return SourceSpan(getattr(ast_object, 'lineno', None), getattr(ast_object, 'col_offset', None),
+                          getattr(ast_object, 'end_lineno', None), getattr(ast_object, 'end_col_offset', None))
+
+    def __repr__(self):
+        return f'SourceSpan({self.lineno}:{self.col_offset}-{self.end_lineno}:{self.end_col_offset})'
+
+
+def unparse_expr(ast_expr: _ast.expr) -> str:
+    """
+    unparse_expr returns the Python source code of an expression (e.g. the test of an if-sentence).
+    """
+    return _unparse(ast_expr).strip()
+
+
+def _unparse(ast_object: _ast.AST) -> str:
+    """
+    _unparse is astunparse.unparse, timed as the `text` stage when a BuildProfile is active.
+
+    astunparse (and six, tokenize...) is imported on the first text made:
+    not by `import pyflowchart`, nor by conversions served from a cache.
+    """
+    import astunparse
+
+    profile = active_profile()
+    if profile is None:
+        return astunparse.unparse(ast_object)
+
+    t = time.perf_counter()
+    source = astunparse.unparse(ast_object)
+    profile.add('text', time.perf_counter() - t)
+    return source
+
+
+def _simplify(func, *args, **kwargs):
+    """
+    _simplify returns func(*args, **kwargs), timed as the `simplify` stage when a BuildProfile is active.
+    """
+    profile = active_profile()
+    if profile is None:
+        return func(*args, **kwargs)
+
+    t = time.perf_counter()
+    result = func(*args, **kwargs)
+    profile.add('simplify', time.perf_counter() - t)
+    return result
 
 
 class AstConditionNode(AstNode, ConditionNode):
     """
     AstConditionNode is a ConditionNode for _ast.For | _ast.While | _ast.If ({for|while|if}-sentence in code)
     """
+    __slots__ = ()
 
     def __init__(self, ast_cond: _ast.stmt, **kwargs):
         """
@@ -50,24 +119,34 @@ class AstConditionNode(AstNode, ConditionNode):
     def cond_expr(self) -> str:
         """
         cond_expr returns the condition expression of if|while|for sentence.
+
+        Only the header expressions (`test`, or `target` & `iter`) are unparsed,
+        never the (maybe huge & deeply nested) bodies.
+        """
+        return AstConditionNode.cond_expr_of(self.ast_object)
+
+    @staticmethod
+    def cond_expr_of(ast_cond: _ast.stmt) -> str:
+        """
+        cond_expr_of is cond_expr of given if|while|for sentence, without making a node.
         """
-        # XXX: the extra cost is too big
-        source = astunparse.unparse(self.ast_object)
-        loop_statement = source.strip()
-        lines = loop_statement.splitlines()
+        if isinstance(ast_cond, _ast.For):
+            return f'for {unparse_expr(ast_cond.target)} in {unparse_expr(ast_cond.iter)}'
+        if isinstance(ast_cond, _ast.AsyncFor):
+            return f'async for {unparse_expr(ast_cond.target)} in {unparse_expr(ast_cond.iter)}'
+        if isinstance(ast_cond, _ast.While):
+            return f'while {unparse_expr(ast_cond.test)}'
+        if isinstance(ast_cond, _ast.If):
+            return f'if {unparse_expr(ast_cond.test)}'
+
+        # others: the first line of the whole statement
+        source = _unparse(ast_cond)
+        lines = source.strip().splitlines()
         if len(lines) >= 1:
             return lines[0].rstrip(':')
         else:
             return 'True'
 
-    def fc_connection(self) -> str:
-        """
-        to avoid meaningless `cond999->`
-
-        Returns: a blank str ""
-        """
-        return ""
-
 
 ###################
 #   FunctionDef   #
@@ -78,6 +157,7 @@ class FunctionDefStart(AstNode, StartNode):
     FunctionDefStart is a StartNode from _ast.FunctionDef,
     standing for the start of a function.
     """
+    __slots__ = ()
 
     def __init__(self, ast_function_def: _ast.FunctionDef, **kwargs):
         AstNode.__init__(self, ast_function_def, **kwargs)
@@ -89,6 +169,7 @@ class FunctionDefEnd(AstNode, EndNode):
     FunctionDefEnd is a EndNode from _ast.FunctionDef,
      standing for the end of a function.
     """
+    __slots__ = ()
 
     def __init__(self, ast_function_def: _ast.FunctionDef, **kwargs):
         AstNode.__init__(self, ast_function_def, **kwargs)
@@ -100,6 +181,7 @@ class FunctionDefArgsInput(AstNode, InputOutputNode):
     FunctionDefArgsInput is a InputOutputNode from _ast.FunctionDef,
     standing for the args (input) of a function.
     """
+    __slots__ = ()
 
     def __init__(self, ast_function_def: _ast.FunctionDef, **kwargs):
         AstNode.__init__(self, ast_function_def, **kwargs)
@@ -129,19 +211,25 @@ class FunctionDef(NodesGroup, AstNode):
         Args:
             **kwargs: None
         """
+        _drive(self._build(ast_func, **kwargs))
+
+    def _build(self, ast_func: _ast.FunctionDef, **kwargs):
+        """
+        _build is the body of __init__ as build steps, see _drive.
+        """
         AstNode.__init__(self, ast_func, **kwargs)
 
         # get nodes
         self.func_start = FunctionDefStart(ast_func, **kwargs)
         self.func_args_input = FunctionDefArgsInput(ast_func, **kwargs)
-        self.body_head, self.body_tails = self.parse_func_body(**kwargs)
+        self.body_head, self.body_tails = yield from self.parse_func_body(**kwargs)
         self.func_end = FunctionDefEnd(ast_func, **kwargs)
 
         # connect
         self.func_start.connect(self.func_args_input)
         self.func_args_input.connect(self.body_head)
         for t in self.body_tails:
-            if isinstance(t, Node):
+            if isinstance(t, (Node, Connection)):
                 t.connect(self.func_end)
 
         NodesGroup.__init__(self, self.func_start, [self.func_end])
@@ -155,7 +243,7 @@ class FunctionDef(NodesGroup, AstNode):
             - body_head
             - body_tails
         """
-        p = parse(self.ast_object.body, **kwargs)
+        p = yield _parse_steps(self.ast_object.body, **kwargs)
         return p.head, p.tails
 
 
@@ -165,6 +253,7 @@ class FunctionDef(NodesGroup, AstNode):
 
 class LoopCondition(AstConditionNode):
     """a AstConditionNode special for Loop"""
+    __slots__ = ()
 
     def connect(self, sub_node, direction='') -> None:
         if direction:
@@ -213,39 +302,84 @@ class Loop(NodesGroup, AstNode):
                                            (Default: True)
                                            See self.simplify
         """
+        _drive(self._build(ast_loop, **kwargs))
+
+    def _build(self, ast_loop: _ast.stmt, **kwargs):
+        """
+        _build is the body of __init__ as build steps, see _drive.
+        """
         AstNode.__init__(self, ast_loop, **kwargs)
 
         self.cond_node = LoopCondition(ast_loop)
 
         NodesGroup.__init__(self, self.cond_node)
 
-        self.parse_loop_body(**kwargs)
+        yield from self.parse_loop_body(**kwargs)
 
         self._virtual_no_tail()
 
         if kwargs.get("simplify", True):
-            self.simplify()
+            _simplify(self.simplify)
+
+    @classmethod
+    def simplified(cls, ast_loop: _ast.stmt, **kwargs):
+        """
+        simplified builds the simplified form (see simplify) of a one-line-body loop directly,
+        deciding by the AST before building anything else.
+
+        parse() uses it instead of building the whole Loop, then simplifying it:
+        the LoopCondition, connections & body graph would be garbage.
+
+        Returns:
+            a Loop grouping only the simplified OperationNode (cond_node is None),
+            or None if ast_loop is not a one-line-body loop
+        """
+        if not cls.simplifiable(ast_loop):
+            return None
+
+        body = _node_class(ast_loop.body[0])(ast_loop.body[0], **kwargs)
+        cond_text = AstConditionNode.cond_expr_of(ast_loop)
+
+        simplified = OperationNode(f'{body.node_text} while {cond_text.lstrip("for").lstrip("while")}')
+        simplified.ast_object = ast_loop  # stands for the statement
+        simplified.node_name = f'cond{simplified.id}'  # named as a condition, as simplify() names it
+
+        loop = cls.__new__(cls)
+        AstNode.__init__(loop, ast_loop, **kwargs)
+        loop.cond_node = None
+        NodesGroup.__init__(loop, simplified, [simplified])
+        return loop
+
+    @staticmethod
+    def simplifiable(ast_loop: _ast.stmt) -> bool:
+        """
+        simplifiable tells by the AST whether simplify turns the loop into one operation node:
+        its body is one plain node, connecting back to the condition (e.g. a break connects to nothing).
+        """
+        if len(ast_loop.body) != 1:
+            return False
+        body_class = _node_class(ast_loop.body[0])
+        return not issubclass(body_class, (NodesGroup, ConditionNode)) and body_class.connect is Node.connect
 
     def parse_loop_body(self, **kwargs) -> None:
         """
         Parse and Connect loop-body (a node graph) to self.cond_node (LoopCondition), extend self.tails with tails got.
         """
-        progress = parse(self.ast_object.body, **kwargs)
+        process = yield _parse_steps(self.ast_object.body, **kwargs)
 
-        if progress.head is not None:
-            process = parse(self.ast_object.body, **kwargs)
+        if process.head is not None:
             # head
             self.cond_node.connect_yes(process.head)
             # tails connect back to cond
             for tail in process.tails:
-                if isinstance(tail, Node):
+                if isinstance(tail, (Node, Connection)):
                     tail.set_connect_direction("left")
                     tail.connect(self.cond_node)
         else:
             noop = SubroutineNode("no-op")
             noop.set_connect_direction("left")
             noop.connect(self.cond_node)
-            self.cond_node.connection_yes(noop)
+            self.cond_node.connect_yes(noop)
 
     def _virtual_no_tail(self) -> None:
         virtual_no = CondYN(self, CondYN.NO)
@@ -278,6 +412,7 @@ class Loop(NodesGroup, AstNode):
                 simplified = OperationNode(f'{body.node_text} while {cond.node_text.lstrip("for").lstrip("while")}')
 
                 simplified.node_name = self.head.node_name
+                simplified.ast_object = self.ast_object  # stands for the same statement
                 self.head = simplified
                 self.tails = [simplified]
 
@@ -291,6 +426,7 @@ class Loop(NodesGroup, AstNode):
 
 class IfCondition(AstConditionNode):
     """a AstConditionNode special for If"""
+    __slots__ = ()
 
     def is_one_line_body(self) -> bool:
         """
@@ -353,25 +489,67 @@ class If(NodesGroup, AstNode):
                                            (Default: True)
                                            See self.simplify
         """
+        _drive(self._build(ast_if, **kwargs))
+
+    def _build(self, ast_if: _ast.If, **kwargs):
+        """
+        _build is the body of __init__ as build steps, see _drive.
+        """
         AstNode.__init__(self, ast_if, **kwargs)
 
         self.cond_node = IfCondition(ast_if)
 
         NodesGroup.__init__(self, self.cond_node)
 
-        self.parse_if_body(**kwargs)
-        self.parse_else_body(**kwargs)
+        yield from self.parse_if_body(**kwargs)
+        yield from self.parse_else_body(**kwargs)
 
         if kwargs.get("simplify", True):
-            self.simplify()
+            _simplify(self.simplify)
         if kwargs.get("conds_align", False) and self.cond_node.is_no_else():
             self.cond_node.connection_yes.set_connect_direction("right")
 
+    @classmethod
+    def simplified(cls, ast_if: _ast.If, **kwargs):
+        """
+        simplified builds the simplified form (see simplify) of a one-line-body if (without else) directly,
+        deciding by the AST before building anything else. See Loop.simplified.
+
+        Returns:
+            an If grouping only the simplified OperationNode (cond_node is None),
+            or None if ast_if is not a one-line-body if without else
+        """
+        if not cls.simplifiable(ast_if):
+            return None
+
+        body = _node_class(ast_if.body[0])(ast_if.body[0], **kwargs)
+        cond_text = AstConditionNode.cond_expr_of(ast_if)
+
+        simplified = OperationNode(f'{body.node_text} if {cond_text.lstrip("if")}')
+        simplified.ast_object = ast_if  # stands for the statement
+        simplified.node_name = f'cond{simplified.id}'  # named as a condition, as simplify() names it
+
+        if_ = cls.__new__(cls)
+        AstNode.__init__(if_, ast_if, **kwargs)
+        if_.cond_node = None
+        NodesGroup.__init__(if_, simplified, [simplified])
+        return if_
+
+    @staticmethod
+    def simplifiable(ast_if: _ast.If) -> bool:
+        """
+        simplifiable tells by the AST whether simplify turns the if into one operation node:
+        it has no else, and its body is one plain node.
+        """
+        if ast_if.orelse or len(ast_if.body) != 1:
+            return False
+        return not issubclass(_node_class(ast_if.body[0]), (NodesGroup, ConditionNode))
+
     def parse_if_body(self, **kwargs) -> None:
         """
         Parse and Connect if-body (a node graph) to self.cond_node (IfCondition).
         """
-        progress = parse(self.ast_object.body, **kwargs)
+        progress = yield _parse_steps(self.ast_object.body, **kwargs)
 
         if progress.head is not None:
             self.cond_node.connect_yes(progress.head)
@@ -390,7 +568,7 @@ class If(NodesGroup, AstNode):
         """
         Parse and Connect else-body (a node graph) to self.cond_node (IfCondition).
         """
-        progress = parse(self.ast_object.orelse, **kwargs)
+        progress = yield _parse_steps(self.ast_object.orelse, **kwargs)
 
         if progress.head is not None:
             self.cond_node.connect_no(progress.head)
@@ -423,6 +601,7 @@ class If(NodesGroup, AstNode):
                 simplified = OperationNode(f'{body.node_text} if {cond.node_text.lstrip("if")}')
 
                 simplified.node_name = self.head.node_name
+                simplified.ast_object = self.ast_object  # stands for the same statement
                 self.head = simplified
                 self.tails = [simplified]
 
@@ -446,9 +625,205 @@ class If(NodesGroup, AstNode):
             - https://github.com/adrai/flowchart.js/issues/221#issuecomment-846919013
             - https://github.com/adrai/flowchart.js/issues/115
         """
+        if self.cond_node is None:  # simplified, see If.simplified
+            return
         self.cond_node.no_align_next()
 
 
+#######################
+#   With, ClassDef    #
+#######################
+
+class BlockHeader(AstNode, OperationNode):
+    """
+    BlockHeader is an OperationNode for the header of a with|class sentence, e.g. `with open(f) as fp`.
+
+    Only the header expressions are unparsed, never the body.
+    """
+    __slots__ = ()
+
+    def __init__(self, ast_block: _ast.stmt, **kwargs):
+        AstNode.__init__(self, ast_block, **kwargs)
+        OperationNode.__init__(self, operation=self.header())
+
+    def header(self) -> str:
+        ast_block = self.ast_object
+        if isinstance(ast_block, (_ast.With, _ast.AsyncWith)):
+            items = ', '.join(unparse_expr(item.context_expr) +
+                              (f' as {unparse_expr(item.optional_vars)}' if item.optional_vars else '')
+                              for item in ast_block.items)
+            return f'{"async with" if isinstance(ast_block, _ast.AsyncWith) else "with"} {items}'
+        if isinstance(ast_block, _ast.ClassDef):
+            bases = [unparse_expr(base) for base in ast_block.bases]
+            bases += [f'{kw.arg}={unparse_expr(kw.value)}' if kw.arg else f'**{unparse_expr(kw.value)}'
+                      for kw in ast_block.keywords]
+            return f'class {ast_block.name}({", ".join(bases)})' if bases else f'class {ast_block.name}'
+        return AstConditionNode.cond_expr_of(ast_block)  # the first line
+
+
+class Block(NodesGroup, AstNode):
+    """
+    Block is a AstNode for the sentences that run their body once, in the flow:
+    with-sentences (With) & class-sentences (ClassDef).
+
+    This class is a NodesGroup with BlockHeader & body.
+    """
+
+    def __init__(self, ast_block: _ast.stmt, **kwargs):
+        """
+        Construct Block object will make following Node chain:
+            Block -> BlockHeader -> [body] -> <next_node>
+
+        Args:
+            **kwargs: see parse
+        """
+        _drive(self._build(ast_block, **kwargs))
+
+    def _build(self, ast_block: _ast.stmt, **kwargs):
+        """
+        _build is the body of __init__ as build steps, see _drive.
+        """
+        AstNode.__init__(self, ast_block, **kwargs)
+
+        self.header_node = BlockHeader(ast_block, **kwargs)
+
+        if isinstance(ast_block, _ast.ClassDef):  # defining the methods does not run them, see _parse_steps
+            process = yield _parse_steps(ast_block.body, methods=True, **kwargs)
+        else:
+            process = yield _parse_steps(ast_block.body, **kwargs)
+        if process.head is not None:
+            self.header_node.connect(process.head)
+            tails = process.tails
+        else:
+            tails = [self.header_node]
+
+        NodesGroup.__init__(self, self.header_node, tails)
+
+
+class With(Block):
+    """
+    With is a AstNode for _ast.With | _ast.AsyncWith (with-sentence in python source code)
+
+    This class is a NodesGroup with BlockHeader('with ...') & with-body.
+    """
+
+
+class ClassDef(Block):
+    """
+    ClassDef is a AstNode for _ast.ClassDef (class-sentence in python source code)
+
+    This class is a NodesGroup with BlockHeader('class ...') & class-body (e.g. the FunctionDefs of methods).
+    The flow of the class-body goes from the start of a method to the next statement:
+    a method body ending in return would not lead anywhere.
+    """
+
+
+###########
+#   Try   #
+###########
+
+class TryCondition(AstNode, ConditionNode):
+    """
+    TryCondition is a ConditionNode for the head of a try-sentence:
+    yes: the try-body runs through, no: it raises (to the except clauses).
+    """
+    __slots__ = ()
+
+    def __init__(self, ast_try: _ast.stmt, **kwargs):
+        AstNode.__init__(self, ast_try, **kwargs)
+        ConditionNode.__init__(self, cond='try')
+
+
+class ExceptCondition(AstNode, ConditionNode):
+    """
+    ExceptCondition is a ConditionNode for _ast.ExceptHandler (an except clause of a try-sentence):
+    yes: the exception is caught by the clause.
+    """
+    __slots__ = ()
+
+    def __init__(self, ast_handler: _ast.ExceptHandler, star=False, **kwargs):
+        AstNode.__init__(self, ast_handler, **kwargs)
+        cond = 'except*' if star else 'except'
+        if ast_handler.type is not None:
+            cond += f' {unparse_expr(ast_handler.type)}'
+        if ast_handler.name:
+            cond += f' as {ast_handler.name}'
+        ConditionNode.__init__(self, cond=cond)
+
+
+class Try(NodesGroup, AstNode):
+    """
+    Try is a AstNode for _ast.Try (try-sentence in python source code)
+
+    This class is a NodesGroup that connects TryCondition, try-body, ExceptConditions & except-bodies,
+    else-body & finally-body.
+    """
+
+    def __init__(self, ast_try: _ast.stmt, **kwargs):
+        """
+        Construct Try object will make following Node chain:
+            Try -> TryCondition -> (yes) -> [try-body] -> [else-body] -> [finally-body]
+                                -> (no)  -> ExceptCondition 1 -> (yes) -> [except-body 1] -> [finally-body]
+                                                              -> (no)  -> ExceptCondition 2 -> ...
+                                                                             -> (no) -> [finally-body]
+            i.e. the except clauses, as an if-elif chain, are entered from the TryCondition,
+            whatever ends the try-body (e.g. a return). An exception caught by no clause goes to the finally-body.
+            Without except clause: TryCondition -> (no) -> [finally-body]
+
+        Args:
+            **kwargs: see parse
+        """
+        _drive(self._build(ast_try, **kwargs))
+
+    def _build(self, ast_try: _ast.stmt, **kwargs):
+        """
+        _build is the body of __init__ as build steps, see _drive.
+        """
+        AstNode.__init__(self, ast_try, **kwargs)
+
+        self.try_cond = TryCondition(ast_try, **kwargs)
+
+        process = yield _parse_steps(ast_try.body, **kwargs)
+        self.try_cond.connect_yes(process.head)
+        tails = list(process.tails)
+
+        process = yield _parse_steps(ast_try.orelse, **kwargs)
+        if process.head is not None:
+            _connect_tails(tails, process.head)
+            tails = list(process.tails)
+
+        self.except_conds = []
+        for handler in ast_try.handlers:
+            cond = ExceptCondition(handler, star=isinstance(ast_try, getattr(_ast, 'TryStar', ())), **kwargs)
+            (self.except_conds[-1] if self.except_conds else self.try_cond).connect_no(cond)
+            self.except_conds.append(cond)
+
+            process = yield _parse_steps(handler.body, **kwargs)
+            cond.connect_yes(process.head)
+            tails.extend(process.tails)
+
+        # connect virtual connection_no: the exception not caught
+        last = self.except_conds[-1] if self.except_conds else self.try_cond
+        virtual_no = CondYN(last, CondYN.NO)
+        last.connection_no = virtual_no
+        last.connections.append(virtual_no)
+        tails.append(virtual_no)
+
+        process = yield _parse_steps(ast_try.finalbody, **kwargs)
+        if process.head is not None:
+            _connect_tails(tails, process.head)
+            tails = process.tails
+
+        NodesGroup.__init__(self, self.try_cond, tails)
+
+
+def _connect_tails(tails: list, node: Node) -> None:
+    """_connect_tails connects every tail (Node or Connection) to node."""
+    for t in tails:
+        if isinstance(t, (Node, Connection)):
+            t.connect(node)
+
+
 ####################
 #   Common, Call   #
 ####################
@@ -457,6 +832,7 @@ class CommonOperation(AstNode, OperationNode):
     """
     CommonOperation is an OperationNode for any _ast.AST (any sentence in python source code)
     """
+    __slots__ = ()
 
     def __init__(self, ast_object: _ast.AST, **kwargs):
         AstNode.__init__(self, ast_object, **kwargs)
@@ -467,6 +843,7 @@ class CallSubroutine(AstNode, SubroutineNode):
     """
     CallSubroutine is an SubroutineNode for _ast.Call (function call sentence in source)
     """
+    __slots__ = ()
 
     def __init__(self, ast_call: _ast.Call, **kwargs):
         AstNode.__init__(self, ast_call, **kwargs)
@@ -482,6 +859,7 @@ class BreakContinueSubroutine(AstNode, SubroutineNode):
     """
     BreakContinueSubroutine is an SubroutineNode for _ast.Break or _ast.Continue (break/continue sentence in source)
     """
+    __slots__ = ()
 
     # TODO: Including information about the LoopCondition that is to be break/continue.
 
@@ -498,6 +876,7 @@ class YieldOutput(AstNode, InputOutputNode):
     """
      YieldOutput is a InputOutputNode (Output) for _ast.Yield (yield sentence in python source code)
     """
+    __slots__ = ()
 
     def __init__(self, ast_return: _ast.Return, **kwargs):
         AstNode.__init__(self, ast_return, **kwargs)
@@ -512,6 +891,7 @@ class ReturnOutput(AstNode, InputOutputNode):
     """
      ReturnOutput is a InputOutputNode (Output) for _ast.Return (return sentence in python source code)
     """
+    __slots__ = ()
 
     def __init__(self, ast_return: _ast.Return, **kwargs):
         AstNode.__init__(self, ast_return, **kwargs)
@@ -522,6 +902,7 @@ class ReturnEnd(AstNode, EndNode):
     """
     ReturnEnd is a EndNode for _ast.Return (return sentence in python source code)
     """
+    __slots__ = ()
 
     def __init__(self, ast_return: _ast.Return, **kwargs):
         AstNode.__init__(self, ast_return, **kwargs)
@@ -558,8 +939,6 @@ class Return(NodesGroup, AstNode):
             self.output_node.connect(self.end_node)
             self.head = self.output_node
 
-        self.connections.append(self.head)
-
         NodesGroup.__init__(self, self.head, [self.end_node])
 
     # def fc_definition(self) -> str:
@@ -581,17 +960,234 @@ class Return(NodesGroup, AstNode):
         pass
 
 
-# Sentence: common | func | cond | loop | ctrl
+################
+#   Collapse   #
+################
+
+_collapsed_keywords = {
+    _ast.If: 'if',
+    _ast.For: 'for',
+    _ast.AsyncFor: 'async for',
+    _ast.While: 'while',
+    _ast.With: 'with',
+    _ast.AsyncWith: 'async with',
+    _ast.Try: 'try',
+}
+if hasattr(_ast, 'TryStar'):
+    _collapsed_keywords[_ast.TryStar] = 'try'
+
+# the statements with a body, i.e. built by an AstNode class with a `_build`
+_collapsible_types = frozenset([*_collapsed_keywords, _ast.FunctionDef, _ast.AsyncFunctionDef, _ast.ClassDef])
+
+# the fields holding statements (& except clauses)
+_body_fields = frozenset(['body', 'handlers', 'orelse', 'finalbody'])
+
+
+def _statement_children(ast_object: _ast.AST) -> list:
+    """_statement_children returns the statements (& except clauses) right in ast_object, in source order
+    (the order of ast.iter_child_nodes, without the expressions)."""
+    children = []
+    for name in ast_object._fields:
+        if name in _body_fields:
+            children.extend(getattr(ast_object, name))
+    return children
+
+
+class Collapsed(NodesGroup, AstNode):
+    """
+    Collapsed is a AstNode for a statement with a body (def, class, if, for, while, with, try)
+    nested deeper than the max_depth of a Collapse: nothing in it is built, nor unparsed.
+
+    This class is a NodesGroup with one SubroutineNode summing the statement up, e.g.
+    `for ... (12 lines, collapsed: 0.3.1)`, until it is expanded (see Collapse.expand):
+    then the group of the statement, built, takes the place of the summary.
+    """
+
+    def __init__(self, ast_object: _ast.stmt, path: str, **kwargs):
+        """
+        Args:
+            path: str, the path of the statement, see Collapse
+        """
+        AstNode.__init__(self, ast_object, **kwargs)
+        self.path = path
+
+        self.summary = SubroutineNode(self.summary_text(ast_object, path))
+        self.summary.ast_object = ast_object  # stands for the statement
+
+        # the nodes of the statements before & after it, for conds_align on expansion (see parse)
+        self.prev_node = None
+        self.next_node = None
+        self.method = False  # a def in a class body, see _as_method
+
+        NodesGroup.__init__(self, self.summary, [self.summary])
+
+    @staticmethod
+    def summary_text(ast_object: _ast.stmt, path: str) -> str:
+        """summary_text sums a statement up without unparsing it: its keyword (or name), length & path."""
+        if isinstance(ast_object, (_ast.FunctionDef, _ast.AsyncFunctionDef)):
+            keyword = 'async def' if isinstance(ast_object, _ast.AsyncFunctionDef) else 'def'
+            header = f'{keyword} {ast_object.name}(...)'
+        elif isinstance(ast_object, _ast.ClassDef):
+            header = f'class {ast_object.name}'
+        else:
+            header = f'{_collapsed_keywords.get(type(ast_object), type(ast_object).__name__.lower())} ...'
+
+        end_lineno = getattr(ast_object, 'end_lineno', None)  # Python 3.8+
+        lines = f'{end_lineno - ast_object.lineno + 1} lines, ' if end_lineno is not None else ''
+        return f'{header} ({lines}collapsed: {path})'
+
+    def expand(self, kwargs: dict) -> Node:
+        """
+        expand builds the statement (with the parse options kwargs), and puts it in place of the summary node:
+        the group built is connected to what the summary was connected to.
+
+        Returns:
+            the group built
+        """
+        node = _drive(_parse_steps([self.ast_object], **kwargs)).head
+        if self.method:
+            _as_method(node)
+
+        for sub_node in self.summary.connections:
+            node.connect(sub_node)
+        self.head = node
+        self.tails = [node]
+
+        # ConditionNode alignment support (Issue#14), as parse does for the statements built in a row
+        if kwargs.get("conds_align", False) and isinstance(node, If):
+            prev_node, next_node = _expanded(self.prev_node), _expanded(self.next_node)
+            if isinstance(prev_node, If):
+                prev_node.align()
+            if isinstance(next_node, If):
+                node.align()
+        return node
+
+
+def _expanded(node: Node) -> Node:
+    """_expanded returns the group built for a Collapsed node, if expanded (otherwise the Collapsed node)."""
+    if isinstance(node, Collapsed) and not isinstance(node.head, SubroutineNode):
+        return node.head
+    return node
+
+
+class CollapsedPathError(KeyError):
+    """CollapsedPathError: no statement is collapsed at a path given to expand (see Collapse)."""
+
+
+class Collapse(object):
+    """
+    Collapse limits the depth of a build: with parse(ast_list, collapse=Collapse(ast_list, max_depth)),
+    the statements with a body (see Collapsed) nested deeper than max_depth are built as Collapsed nodes.
+    The statements of ast_list are at depth 1, the ones in their bodies at depth 2, and so on.
+
+    A statement is identified by its path: the indexes of the statements (& except clauses)
+    from ast_list down to it, joined by dots. E.g.
+
+        for x in a:          # 0
+            if x:            # 0.0
+                f(x)         # 0.0.0
+            else:
+                while x:     # 0.0.1: orelse follows body
+                    x -= 1   # 0.0.1.0
+        print(a)             # 1
+
+    A collapsed statement can be expanded on demand (see expand), or up front (expand paths):
+    its body is built then, with the statements in it collapsed in turn (i.e. one level per expansion).
+    """
+
+    def __init__(self, ast_list: List[_ast.AST], max_depth: int, expand=()):
+        """Collapse(ast_list, max_depth, expand) plans the collapsed statements of ast_list.
+
+        Args:
+            ast_list: List[_ast.AST], the statements to be parsed
+            max_depth: int, the depth of the deepest statements with a body to build
+            expand: Iterable[str], paths of statements to expand up front (their parent statements too).
+                CollapsedPathError (a KeyError) if one of them is not the path of a statement that would be
+                collapsed, as with expand.
+        """
+        self.max_depth = max_depth
+        self.collapsed = {}  # path -> Collapsed node, in the graph
+        self.kwargs = None  # the options of the parse, to build the expansions alike. Set by parse.
+        self.ids = None  # the node id counter of the build (see node_id_scope), for the expansions
+
+        self._paths = {}  # id(statement) -> path, of the statements to collapse
+        # expanding a statement takes expanding the ones it is nested in
+        expanded = set()
+        for path in expand:
+            parts = path.split('.')
+            expanded.update('.'.join(parts[:k]) for k in range(1, len(parts) + 1))
+        planned = self._plan(ast_list, '', 1, expanded)
+        for path in expand:
+            if path not in planned:
+                raise CollapsedPathError(f'{path}: no collapsed statement at this path')
+
+    def _plan(self, ast_list: list, prefix: str, depth: int, expand: set) -> set:
+        """_plan walks down the statements of ast_list (at depth), to the ones to collapse.
+        Statements are checked only: no expression is visited.
+
+        Returns:
+            the paths of the statements to collapse that are expanded instead
+        """
+        planned = set()
+        stack = [(ast_list, prefix, depth)]
+        while stack:
+            statements, prefix, depth = stack.pop()
+            for i, ast_object in enumerate(statements):
+                path = f'{prefix}{i}'
+                if isinstance(ast_object, _ast.excepthandler):  # a clause of a try: at the depth of the try body
+                    stack.append((_statement_children(ast_object), path + '.', depth))
+                elif type(ast_object) not in _collapsible_types:
+                    continue
+                elif depth > self.max_depth and path not in expand:
+                    self._paths[id(ast_object)] = path
+                else:
+                    if depth > self.max_depth:
+                        planned.add(path)
+                    stack.append((_statement_children(ast_object), path + '.', depth + 1))
+        return planned
+
+    def collapse(self, ast_object: _ast.AST, **kwargs):
+        """collapse returns the Collapsed node of ast_object if it is to be collapsed, otherwise None."""
+        path = self._paths.pop(id(ast_object), None)
+        if path is None:
+            return None
+        node = self.collapsed[path] = Collapsed(ast_object, path, **kwargs)
+        return node
+
+    def expand(self, path: str) -> Node:
+        """
+        expand builds the statement collapsed at path into the graph, in place of its summary node.
+        The statements with a body in it are collapsed, to be expanded in turn.
+        The new nodes take the ids following the ones of the build: the names of the others do not change.
+
+        Args:
+            path: str, see Collapse. CollapsedPathError (a KeyError) if no statement is collapsed at path
+                (e.g. expanded already).
+
+        Returns:
+            the group built
+        """
+        if path not in self.collapsed:
+            raise CollapsedPathError(f'{path}: no collapsed statement at this path')
+        collapsed = self.collapsed.pop(path)
+        # children of a collapsed statement are deeper than max_depth: collapse all of them
+        self._plan(_statement_children(collapsed.ast_object), path + '.', self.max_depth + 1, set())
+        with node_id_scope(self.ids):
+            return collapsed.expand(self.kwargs)
+
+
+# Sentence: common | func | cond | loop | ctrl | block
 # - func: def
 # - cond: if
 # - loop: for, while
 # - ctrl: break, continue, return, yield, call
+# - block: with, class, try
 # - common: others
-# Special sentence: cond | loop | ctrl
-# TODO: Try, With
+# Special sentence: func | cond | loop | ctrl | block
 
 __func_stmts = {
-    _ast.FunctionDef: FunctionDef
+    _ast.FunctionDef: FunctionDef,
+    _ast.AsyncFunctionDef: FunctionDef,
 }
 
 __cond_stmts = {
@@ -600,6 +1196,7 @@ __cond_stmts = {
 
 __loop_stmts = {
     _ast.For: Loop,
+    _ast.AsyncFor: Loop,
     _ast.While: Loop,
 }
 
@@ -611,8 +1208,90 @@ __ctrl_stmts = {
     _ast.Call: CallSubroutine,
 }
 
+__block_stmts = {
+    _ast.With: With,
+    _ast.AsyncWith: With,
+    _ast.ClassDef: ClassDef,
+    _ast.Try: Try,
+}
+if hasattr(_ast, 'TryStar'):  # try-except* (Python 3.11+)
+    __block_stmts[_ast.TryStar] = Try
+
 # merge dict: PEP448
-__special_stmts = {**__func_stmts, **__cond_stmts, **__loop_stmts, **__ctrl_stmts}
+__special_stmts = {**__func_stmts, **__cond_stmts, **__loop_stmts, **__ctrl_stmts, **__block_stmts}
+
+
+class OptionPasses(object):
+    """
+    OptionPasses turns the simplify & conds_align options of parse into passes over a graph built already.
+
+    Build the graph with both options off, recording the passes:
+
+        passes = OptionPasses()
+        p = parse(ast_list, simplify=False, conds_align=False, passes=passes)
+
+    then passes.simplify(on) & passes.conds_align(on) switch the graph, back and forth, to what
+    parse(ast_list, simplify=..., conds_align=...) builds (node ids aside: a simplified node is named after
+    its condition, see If.simplify), without parsing or building again.
+    """
+
+    def __init__(self):
+        self.simplifiable = []  # If & Loop groups that simplify turns into one node, see If/Loop.simplify
+        self.no_else_ifs = []  # Ifs without else: conds_align directs their yes-connection right, see If._build
+        self.followed_ifs = []  # Ifs followed by an If: conds_align sets align-next=no, see If.align
+        self._simplified = {}  # id(group) -> its simplified node, made on the first simplify
+
+    def record(self, node: Node) -> None:
+        """record is called by parse on every node built, before it is connected to the next one:
+        the groups are checked as at the end of their builds (see If._build & If.simplify)."""
+        if isinstance(node, If):
+            if node.cond_node.is_no_else():
+                self.no_else_ifs.append(node)
+                if node.cond_node.is_one_line_body():
+                    self.simplifiable.append(node)
+        elif isinstance(node, Loop) and node.cond_node.is_one_line_body():
+            self.simplifiable.append(node)
+
+    def simplify(self, on=True) -> None:
+        """simplify switches the one-line-body If & Loop groups to their simplified nodes, or back (on=False)."""
+        for group in self.simplifiable:
+            if not on:
+                group.head = group.cond_node
+                continue
+
+            simplified = self._simplified.get(id(group))
+            if simplified is None:
+                simplified = self._simplified[id(group)] = self._simplified_node(group)
+            group.head = simplified
+
+    @staticmethod
+    def _simplified_node(group: NodesGroup) -> Node:
+        """_simplified_node makes the node standing for a one-line-body If | Loop group, see If.simplify."""
+        cond = group.cond_node
+        body = cond.connection_yes.sub
+        if isinstance(group, If):
+            simplified = OperationNode(f'{body.node_text} if {cond.node_text.lstrip("if")}')
+        else:
+            simplified = OperationNode(f'{body.node_text} while {cond.node_text.lstrip("for").lstrip("while")}')
+        simplified.node_name = cond.node_name
+        simplified.ast_object = group.ast_object  # stands for the same statement
+
+        # the group is left through its (virtual) no-connection: the simplified node takes it
+        no = cond.connection_no
+        simplified.connect_direction = no.direction
+        if no.dst is not None:
+            simplified.connect(no.dst)
+        return simplified
+
+    def conds_align(self, on=True) -> None:
+        """conds_align sets (or clears, on=False) the conds_align options on the If conditions."""
+        for if_ in self.no_else_ifs:
+            if_.cond_node.connection_yes.set_connect_direction("right" if on else None)
+        for if_ in self.followed_ifs:
+            if on:
+                if_.align()
+            elif if_.cond_node._params:
+                if_.cond_node._params.pop('align-next', None)
 
 
 class ParseProcessGraph(NodesGroup):
@@ -633,30 +1312,77 @@ def parse(ast_list: List[_ast.AST], **kwargs) -> ParseProcessGraph:
         * simplify: for If & Loop: simplify the one line body cases
         * conds_align: for If: allow the align-next option set for the condition nodes.
             See https://github.com/cdfmlr/pyflowchart/issues/14
+        * definitions: a pyflowchart.incremental.DefinitionCache to reuse subgraphs of unchanged definitions.
+        * passes: an OptionPasses recording the If & Loop groups built (with simplify & conds_align off),
+            to apply these options later.
+        * collapse: a Collapse, building the statements nested too deep as Collapsed nodes.
 
     Returns:
         ParseGraph
     """
+    collapse = kwargs.get("collapse")
+    if collapse is not None:
+        collapse.kwargs = kwargs  # to build the expansions alike
+    return _drive(_parse_steps(ast_list, **kwargs))
+
+
+def _parse_steps(ast_list: List[_ast.AST], **kwargs):
+    """
+    _parse_steps is parse() as build steps, see _drive.
+
+    Nested bodies (of def, if, for, while) are not parsed by recursive calls:
+    the AstNode classes that have bodies (i.e. that have a `_build` method) are built
+    by yielding their build steps to the driver instead.
+    """
     head_node = None
     tail_node = None
 
     process = ParseProcessGraph(head_node, tail_node)
 
+    simplify = kwargs.get("simplify", True)
+    collapse = kwargs.get("collapse")
+    # methods: ast_list is a class body, see ClassDef. Not for the bodies nested in it.
+    methods = kwargs.pop("methods", False)
+
     for ast_object in ast_list:
         # ast_node_class: some special AstNode subclass or CommonOperation by default.
-        ast_node_class = __special_stmts.get(type(ast_object), CommonOperation)
-
-        # special case: special stmt as a expr value. e.g. function call
-        if type(ast_object) == _ast.Expr:
-            try:
-                ast_node_class = __special_stmts.get(type(ast_object.value), CommonOperation)
-            except AttributeError:
-                # ast_object has no value attribute
-                ast_node_class = CommonOperation
+        ast_node_class = _node_class(ast_object)
 
         assert issubclass(ast_node_class, AstNode)
 
-        node = ast_node_class(ast_object, **kwargs)
+        # collapse: statements nested too deep get a summary node, nothing in them is built
+        node = None
+        if collapse is not None:
+            node = collapse.collapse(ast_object, **kwargs)
+
+        # one-line-body If & Loop: build the simplified node directly, instead of building & simplifying
+        if node is None and simplify and ast_node_class in (If, Loop):
+            node = _simplify(ast_node_class.simplified, ast_object, **kwargs)
+
+        # definitions: a pyflowchart.incremental.DefinitionCache, reusing subgraphs of unchanged def/class
+        definitions = kwargs.get("definitions")
+        if node is None and definitions is not None:
+            node = definitions.reuse(ast_object)
+            if isinstance(node, FunctionDef) and not methods:  # maybe a method where it was built: not here
+                node.tails = [node.func_end]
+
+        if node is None:
+            if hasattr(ast_node_class, '_build'):
+                # same as ast_node_class(ast_object, **kwargs), but runs the __init__ (i.e. _build) steps on our driver
+                node = ast_node_class.__new__(ast_node_class)
+                yield node._build(ast_object, **kwargs)
+            else:
+                node = ast_node_class(ast_object, **kwargs)
+
+            if definitions is not None:
+                definitions.keep(ast_object, node)
+
+        passes = kwargs.get("passes")
+        if passes is not None:
+            passes.record(node)
+
+        if methods:
+            _as_method(node)
 
         if head_node is None:  # is the first node
             head_node = node
@@ -666,9 +1392,16 @@ def parse(ast_list: List[_ast.AST], **kwargs) -> ParseProcessGraph:
 
             # ConditionNode alignment support (Issue#14)
             # XXX: It's ugly to handle it here. But I have no idea, for this moment, to make it ELEGANT.
-            if isinstance(tail_node, If) and isinstance(node, If) and \
-                    kwargs.get("conds_align", False):
-                tail_node.align()
+            if isinstance(tail_node, If) and isinstance(node, If):
+                if kwargs.get("conds_align", False):
+                    tail_node.align()
+                if passes is not None:
+                    passes.followed_ifs.append(tail_node)
+            if collapse is not None:  # Collapsed nodes may turn into Ifs, see Collapsed.expand
+                if isinstance(node, Collapsed):
+                    node.prev_node = tail_node
+                if isinstance(tail_node, Collapsed):
+                    tail_node.next_node = node
 
             tail_node = node
 
@@ -676,3 +1409,54 @@ def parse(ast_list: List[_ast.AST], **kwargs) -> ParseProcessGraph:
     process.append_tails(tail_node)
 
     return process
+
+
+def _as_method(node: Node) -> None:
+    """_as_method makes the flow go on from the start of a def (a FunctionDef | Collapsed def) in a class body,
+    instead of its end: defining a method does not run it."""
+    if isinstance(node, FunctionDef):
+        node.tails = [node.func_start]
+    elif isinstance(node, Collapsed):
+        node.method = True
+
+
+def _node_class(ast_object: _ast.AST):
+    """
+    _node_class returns the AstNode subclass to build for ast_object (a statement):
+    some special AstNode subclass or CommonOperation by default.
+    """
+    # special case: special stmt as a expr value. e.g. function call
+    if type(ast_object) == _ast.Expr:
+        try:
+            return __special_stmts.get(type(ast_object.value), CommonOperation)
+        except AttributeError:
+            # ast_object has no value attribute
+            return CommonOperation
+
+    return __special_stmts.get(type(ast_object), CommonOperation)
+
+
+def _drive(steps):
+    """
+    _drive runs build steps to the end, and returns what the steps return.
+
+    Build steps are generators. A step may yield another (sub) build steps,
+    e.g. the steps to parse a nested body, and gets back the value returned by them:
+
+        body_graph = yield _parse_steps(ast_object.body, **kwargs)
+
+    The driver keeps the suspended steps on an explicit stack,
+    so that building arbitrarily deep nested code takes constant Python stack.
+    """
+    stack = [steps]
+    result = None
+    while stack:
+        try:
+            sub_steps = stack[-1].send(result)
+        except StopIteration as stop:
+            stack.pop()
+            result = stop.value
+        else:
+            stack.append(sub_steps)
+            result = None
+    return result
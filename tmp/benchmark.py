@@ -0,0 +1,665 @@
+"""
+Simple benchmarks for dev.
+
+Run with `python -m pyflowchart.benchmark`.
+
+The scenario suite (synthetic modules of each shape, timing parse(), Flowchart.from_code()
+and Flowchart.flowchart(), with peak memory & node counts) runs with:
+
+    python -m pyflowchart.benchmark --suite --json results.json [--baseline benchmark_baseline.json]
+
+benchmark_baseline.json (next to this file) holds the results of a dev machine: timings compare well
+on the same machine only, node counts (deterministic) compare anywhere.
+
+Copyright 2020 CDFMLR. All rights reserved.
+Use of this source code is governed by a MIT
+license that can be found in the LICENSE file.
+"""
+
+import argparse
+import ast
+import codecs
+import gc
+import itertools
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from pyflowchart import __version__
+from pyflowchart.__main__ import detect_decode, chardet_decode
+from pyflowchart.ast_node import parse
+from pyflowchart.flowchart import Flowchart, FieldIndex, FlowchartRenderer
+from pyflowchart.incremental import IncrementalFlowchart
+from pyflowchart.node import node_id_scope
+from pyflowchart.profiling import BuildProfile
+
+
+def straight_line_code(n: int) -> str:
+    """straight_line_code generates a module of n plain statements (assignments & calls)."""
+    return '\n'.join(f'x{i} = {i}' if i % 3 else f'print(x{i - 1})' for i in range(n)) + '\n'
+
+
+def nested_loops_code(depth: int) -> str:
+    """nested_loops_code generates `depth` nested for/while loops, each with a statement in its body."""
+    lines = []
+    for d in range(depth):
+        pad = '    ' * d
+        lines.append(f'{pad}x{d} = {d}')
+        lines.append(f'{pad}for i{d} in range({d}):' if d % 2 == 0 else f'{pad}while x{d} > {d}:')
+    lines.append('    ' * depth + 'pass')
+    return '\n'.join(lines) + '\n'
+
+
+def many_functions_code(n_funcs: int, lines_per_func=20, edit: int = -1) -> str:
+    """many_functions_code generates n_funcs functions of about lines_per_func lines each.
+
+    The function number `edit` gets an extra statement (i.e. an edited version of the module).
+    """
+    lines = []
+    for f in range(n_funcs):
+        lines.append(f'def func{f}(a, b):')
+        for i in range(0, lines_per_func - 4, 4):
+            lines.append(f'    x{i} = a + {i}')
+            lines.append(f'    if x{i} > b:')
+            lines.append(f'        print(x{i})')
+            lines.append(f'    b = b - x{i}')
+        if f == edit:
+            lines.append('    b = b + 1')
+        lines.append('    print(b)')
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def wide_if_chain_code(n: int) -> str:
+    """wide_if_chain_code generates an if/elif chain of n branches (and an else)."""
+    lines = ['x = int(input())']
+    for i in range(n):
+        lines.append(f'{"if" if i == 0 else "elif"} x == {i}:')
+        lines.append(f'    print({i})')
+    lines.append('else:')
+    lines.append('    print(-1)')
+    return '\n'.join(lines) + '\n'
+
+
+def large_class_code(n_methods: int, lines_per_method=10) -> str:
+    """large_class_code generates a class of n_methods methods of about lines_per_method lines each."""
+    lines = ['class Large(object):']
+    for m in range(n_methods):
+        lines.append(f'    def method{m}(self, a):')
+        for i in range(0, lines_per_method - 2, 3):
+            lines.append(f'        if a > {i}:')
+            lines.append(f'            a = self.step{i}(a)')
+            lines.append(f'        print(a)')
+        lines.append('        self.last = a')  # no return: a returning def ends the flowchart of the body
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def with_heavy_code(n: int, lines_per_block=6) -> str:
+    """with_heavy_code generates n (nested) with-blocks guarding try-statements, at the module level."""
+    lines = []
+    for w in range(n):
+        lines.append(f'with open("f{w}") as f, lock{w % 4}:')
+        lines.append('    with suppress(KeyError):')
+        lines.append('        try:')
+        for i in range(lines_per_block):
+            lines.append(f'            x{i} = f.read({i})')
+        lines.append('        except OSError as e:')
+        lines.append('            log(e)')
+        lines.append('        finally:')
+        lines.append(f'            done({w})')
+    return '\n'.join(lines) + '\n'
+
+
+def guard_clauses_code(n_funcs: int) -> str:
+    """guard_clauses_code generates n_funcs functions of one-line-body ifs & loops (9 statements each)."""
+    lines = []
+    for f in range(n_funcs):
+        lines.append(f'def guard{f}(a, b=None):')
+        lines.append('    if a is None:')
+        lines.append('        raise ValueError("a")')
+        lines.append('    if b is None:')
+        lines.append(f'        b = {f}')
+        lines.append('    for x in a:')
+        lines.append('        b += x')
+        lines.append('    while b > 100:')
+        lines.append('        b //= 2')
+        lines.append('    print(b)')
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def node_count(func) -> int:
+    """node_count returns how many Nodes are created while calling func()."""
+    with node_id_scope(itertools.count(0)) as ids:
+        func()
+        return next(ids)
+
+
+def best_time(func, repeat=3) -> float:
+    """best_time returns the best wall time (seconds) of calling func() `repeat` times."""
+    best = math.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def scaling_exponent(sizes, times) -> float:
+    """scaling_exponent estimates k in `time ~ size^k` from the smallest & largest samples.
+
+    k ≈ 1 means linear scaling, k ≈ 2 means quadratic.
+    """
+    return math.log(times[-1] / times[0]) / math.log(sizes[-1] / sizes[0])
+
+
+def emission_scaling_bench(sizes=(6250, 12500, 25000, 50000)) -> float:
+    """emission_scaling_bench times Flowchart.flowchart() (DSL emission only) on
+    straight-line modules of growing size.
+
+    Returns:
+        the scaling exponent of emission time against statement count
+    """
+    times = []
+    for n in sizes:
+        fc = Flowchart(parse(ast.parse(straight_line_code(n)).body).head)
+        t = best_time(fc.flowchart)
+        times.append(t)
+        print(f'emission: {n:>6} stmts: {t * 1000:9.2f} ms, {t / n * 1e6:6.2f} us/stmt')
+
+    k = scaling_exponent(sizes, times)
+    print(f'emission: scaling exponent {k:.2f} (1.0 is linear)')
+    return k
+
+
+def nested_loops_bench(max_depth=12) -> None:
+    """nested_loops_bench builds deeply nested for/while loops and fails (AssertionError)
+    if the build cost grows exponentially with the nesting depth.
+
+    The cost is measured in allocated nodes, which is deterministic,
+    so the check does not depend on the machine's speed.
+    """
+    counts = []
+    for depth in range(1, max_depth + 1):
+        body = ast.parse(nested_loops_code(depth)).body
+        counts.append(node_count(lambda: parse(body)))
+        t = best_time(lambda: parse(body))
+        print(f'nested loops: depth {depth:>2}: {counts[-1]:>5} nodes, {t * 1000:8.2f} ms')
+
+    # each extra level adds a constant number of nodes: the growth ratio tends to 1.
+    # a body parsed twice per level doubles the count instead.
+    ratio = counts[-1] / counts[-2]
+    print(f'nested loops: growth ratio of the last level {ratio:.2f} (1.0 is linear)')
+    assert ratio < 1.5, f'loop nesting cost grows exponentially: {counts}'
+
+
+def node_memory_bench(n=100000) -> float:
+    """node_memory_bench reports the memory taken by the Node graph of a ~n-node flowchart.
+
+    The AST is parsed before tracing, so the numbers cover the Nodes (and their texts) only.
+
+    Returns:
+        bytes per node
+    """
+    body = ast.parse(straight_line_code(n)).body
+
+    gc.collect()
+    tracemalloc.start()
+    fc = Flowchart(parse(body).head)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = []
+
+    def collect(node):
+        nodes.append(node)
+        return True
+
+    fc._traverse(collect, object())
+
+    per_node = size / len(nodes)
+    print(f'memory: {len(nodes)} nodes: {size / 2 ** 20:.1f} MiB, {per_node:.0f} bytes/node')
+    return per_node
+
+
+def lean_memory_bench(n_funcs=2000) -> float:
+    """lean_memory_bench compares the memory retained by a Flowchart built
+    with & without lean=True (which releases the AST after the build).
+
+    Returns:
+        the ratio of lean memory to default memory
+    """
+    code = many_functions_code(n_funcs)
+
+    sizes = {}
+    for lean in (False, True):
+        gc.collect()
+        tracemalloc.start()
+        fc = Flowchart.from_code(code, simplify=True, lean=lean)
+        gc.collect()
+        sizes[lean] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del fc
+
+    ratio = sizes[True] / sizes[False]
+    print(f'lean: {n_funcs} functions, {code.count(chr(10))} lines: '
+          f'default {sizes[False] / 2 ** 20:.1f} MiB, lean {sizes[True] / 2 ** 20:.1f} MiB ({ratio:.2f}x)')
+    return ratio
+
+
+def allocation_bench(n_funcs=2000) -> dict:
+    """allocation_bench reports the Nodes allocated per statement, with & without simplify,
+    for code made of one-line-body ifs & loops (the statements simplify folds into one node each).
+
+    Returns:
+        {simplify: nodes allocated per statement}
+    """
+    code = guard_clauses_code(n_funcs)
+    statements = sum(isinstance(n, ast.stmt) and not isinstance(n, ast.FunctionDef) for n in ast.walk(ast.parse(code)))
+
+    per_statement = {}
+    for simplify in (False, True):
+        allocated = node_count(lambda: Flowchart.from_code(code, simplify=simplify))
+        per_statement[simplify] = allocated / statements
+        print(f'allocations: simplify={simplify}: {statements} statements: '
+              f'{allocated} nodes, {per_statement[simplify]:.2f} nodes/statement')
+    return per_statement
+
+
+def rerender_bench(n_funcs=1000, repeat=3) -> dict:
+    """rerender_bench times switching simplify & conds_align on a module of guard clauses:
+    converting again (Flowchart.from_code) against rendering the base graph of a FlowchartRenderer.
+
+    Returns:
+        {'from_code' | 'render': seconds per switch}
+    """
+    code = guard_clauses_code(n_funcs)
+    options = [(True, False), (False, True), (True, True), (False, False)]
+
+    def from_code():
+        for simplify, conds_align in options:
+            Flowchart.from_code(code, simplify=simplify, conds_align=conds_align).flowchart()
+
+    renderer = FlowchartRenderer(code)
+
+    def render():
+        for simplify, conds_align in options:
+            renderer.flowchart(simplify, conds_align)
+
+    seconds = {'from_code': best_time(from_code, repeat) / len(options),
+               'render': best_time(render, repeat) / len(options)}
+    print(f'rerender: {code.count(chr(10))} lines: from_code {seconds["from_code"] * 1000:.2f} ms/switch, '
+          f'render {seconds["render"] * 1000:.2f} ms/switch ({seconds["from_code"] / seconds["render"]:.1f}x)')
+    return seconds
+
+
+def collapse_bench(n_methods=2000, depths=(0, 3, 2, 1), repeat=3) -> dict:
+    """collapse_bench times converting a large class with a depth limit (see Flowchart.from_code max_depth):
+    the statements collapsed are not built nor unparsed, so the work saved shows in the time & node count.
+    The code is parsed once: ast.parse (the same whatever the depth) is not timed.
+    Then times expanding one collapsed statement (a method) on demand.
+
+    Returns:
+        {max_depth: (seconds, nodes)}, 0: no limit
+    """
+    code = large_class_code(n_methods)
+    index = FieldIndex(ast.parse(code))
+
+    results = {}
+    for depth in depths:
+        def convert():
+            index.flowchart(max_depth=depth).flowchart()
+
+        results[depth] = (best_time(convert, repeat), node_count(convert))
+        print(f'collapse: {code.count(chr(10))} lines, max_depth={depth or "none"}: '
+              f'{results[depth][0] * 1000:.1f} ms, {results[depth][1]} nodes')
+
+    fc = index.flowchart(max_depth=1)
+    t = time.perf_counter()
+    fc.expand(f'0.{n_methods // 2}')
+    print(f'collapse: expand one method: {(time.perf_counter() - t) * 1000:.2f} ms')
+    return results
+
+
+def coalesce_bench(source_dir=None, max_lines=(4, 8, 16)) -> dict:
+    """coalesce_bench reports the node-count reduction of coalesce (see coalesce_operations) on real code:
+    the flowcharts of all functions in the modules of source_dir (default: the standard library, top level).
+
+    Returns:
+        {max_lines: (nodes before, nodes after)}
+    """
+    if source_dir is None:
+        source_dir = os.path.dirname(os.__file__)
+
+    indexes = []
+    for file in sorted(os.listdir(source_dir)):
+        if not file.endswith('.py'):
+            continue
+        try:
+            with open(os.path.join(source_dir, file), 'rb') as f:
+                indexes.append(FieldIndex(ast.parse(f.read())))
+        except (SyntaxError, ValueError, OSError):
+            continue
+
+    results = {}
+    for n in max_lines:
+        before = after = 0
+        for index in indexes:
+            for field in index.functions():
+                try:
+                    b, a = index.flowchart(field, simplify=True, coalesce=n).coalesced
+                except Exception:  # not convertible (e.g. a match statement, unknown to astunparse)
+                    continue
+                before += b
+                after += a
+        results[n] = (before, after)
+        print(f'coalesce: max_lines={n}: {len(indexes)} modules: {before} -> {after} nodes '
+              f'(-{(before - after) / before * 100 if before else 0:.1f}%)')
+    return results
+
+
+def text_work_bench(size=500) -> None:
+    """text_work_bench reports the node text work (astunparse) of class- & with-heavy modules.
+
+    With structural With/Try/ClassDef nodes, only their headers are unparsed: the text of a node
+    stays as large as a statement header, whatever the size of the bodies."""
+    for name, code in (('large_class_module', large_class_code(size)), ('with_heavy', with_heavy_code(size))):
+        profile = BuildProfile()
+        fc = Flowchart.from_code(code, profile=profile)
+        nodes, _ = fc.edge_table()
+        text = profile.stages['text']
+        lines = code.count('\n')
+        print(f'text work: {name:<20} {lines} lines: {text["calls"]} unparse calls, '
+              f'{text["seconds"] * 1000:.1f} ms ({text["seconds"] / lines * 1e6:.2f} us/line), '
+              f'{len(nodes)} nodes, largest text {max(len(n.node_text) for n in nodes)} chars')
+
+
+def encoded_code(size: int, encoding: str, comment: str, cookie=False) -> bytes:
+    """encoded_code generates a ~size-byte module of functions, a line in 10 commented with comment, in encoding."""
+    lines = many_functions_code(max(1, size // 350)).splitlines(keepends=True)
+    code = ''.join(f'{line.rstrip()}  # {comment}\n' if i % 10 == 0 else line for i, line in enumerate(lines))
+    if cookie:
+        code = f'# -*- coding: {encoding} -*-\n' + code
+    return code.encode(encoding)
+
+
+def _decoded(decode, content: bytes) -> str:
+    """_decoded returns decode(content), or the name of the error it raises."""
+    try:
+        return decode(content)
+    except (UnicodeDecodeError, LookupError) as e:
+        return type(e).__name__
+
+
+def decode_bench(size=2 * 2 ** 20, repeat=3) -> dict:
+    """decode_bench times detect_decode against chardet over the whole file (chardet_decode, as before)
+    on ~size-byte files of different encodings.
+
+    The results must be the same, but where chardet fails (low confidence: decoded as UTF-8)
+    and a coding cookie tells the encoding.
+
+    Returns:
+        {input: (detect_decode seconds, chardet_decode seconds)}
+    """
+    zh = '中文注释：检测源代码的编码'
+    fr = 'café, déjà vu, ça marche'
+    inputs = {
+        'ascii': (encoded_code(size, 'ascii', 'plain comment'), False),
+        'utf-8': (encoded_code(size, 'utf-8', zh + fr), False),
+        'utf-8-sig': (codecs.BOM_UTF8 + encoded_code(size, 'utf-8', zh + fr), False),
+        'gbk': (encoded_code(size, 'gbk', zh), False),
+        'gbk+cookie': (encoded_code(size, 'gbk', zh, cookie=True), True),
+        'latin-1': (encoded_code(size, 'latin-1', fr), False),
+        'latin-1+cookie': (encoded_code(size, 'latin-1', fr, cookie=True), True),
+        # a long ASCII line (e.g. minified data): the sample of non-ASCII lines is found in linear time
+        'latin-1+long line': (b'data = "' + b'x' * (size // 4) + b'"\n' + encoded_code(size, 'latin-1', fr), False),
+    }
+
+    seconds = {}
+    for name, (content, cookie) in inputs.items():
+        new, old = _decoded(detect_decode, content), _decoded(chardet_decode, content)
+        assert new == old or (cookie and old == 'UnicodeDecodeError'), f'{name}: not decoded the same'
+        fast = best_time(lambda: _decoded(detect_decode, content), repeat)
+        full = best_time(lambda: _decoded(chardet_decode, content), repeat)
+        seconds[name] = (fast, full)
+        print(f'decode: {name:<15}{len(content) / 2 ** 20:5.2f} MiB: detect_decode {fast * 1000:8.2f} ms, '
+              f'chardet (whole file) {full * 1000:8.2f} ms ({full / fast:5.1f}x)'
+              f'{"" if len(old) > 32 else ", before: " + old}{"" if len(new) > 32 else ", now: " + new}')
+    return seconds
+
+
+# import-time budget of the CLI (`import pyflowchart.__main__`, as by `python -m pyflowchart`), in ms:
+# ~30 ms on a dev machine (85 ms before chardet, astunparse, concurrent.futures... were imported lazily)
+IMPORT_TIME_BUDGET_MS = 50
+
+# heavy modules the CLI must not import before it needs them
+LAZY_MODULES = ('chardet', 'astunparse', 'six', 'concurrent.futures', 'tempfile', 'hashlib', 'tokenize')
+
+
+def import_time(module='pyflowchart.__main__', repeat=5) -> tuple:
+    """import_time measures `import module` in a new interpreter, with `python -X importtime`.
+
+    Returns:
+        (ms: the best cumulative import time of module & its package, modules: the modules imported
+         by it, with their cumulative times in ms of the best run)
+    """
+    import subprocess
+
+    best, best_modules = math.inf, {}
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+        modules, ms = {}, 0.0
+        for line in stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, cumulative, name = line.split('|')
+                if cumulative.strip().isdigit():
+                    top_level = not name.startswith('  ')  # nested imports are indented
+                    name = name.strip()
+                    modules[name] = int(cumulative) / 1000
+                    if top_level and name in (module.split('.')[0], module):  # the package, module itself
+                        ms += modules[name]
+        if ms < best:
+            best, best_modules = ms, modules
+    return best, best_modules
+
+
+def import_time_bench(budget_ms=IMPORT_TIME_BUDGET_MS, repeat=5) -> list:
+    """import_time_bench checks the import time of the CLI against budget_ms,
+    and that the heavy modules (LAZY_MODULES) are not imported by it.
+
+    Returns:
+        list of str: the problems found, empty if none
+    """
+    ms, modules = import_time(repeat=repeat)
+    print(f'import: pyflowchart.__main__ {ms:.1f} ms (budget {budget_ms} ms)')
+    for name, t in sorted(modules.items(), key=lambda item: -item[1])[:8]:
+        print(f'import:   {name:<30}{t:8.1f} ms')
+
+    problems = [f'{name} imported eagerly' for name in LAZY_MODULES if name in modules]
+    if ms > budget_ms:
+        problems.append(f'import time {ms:.1f} ms over budget {budget_ms} ms')
+    return problems
+
+
+def incremental_bench(n_funcs=1000, repeat=5) -> None:
+    """incremental_bench edits one function of a ~20k-line module, and compares
+    the full rebuild (Flowchart.from_code) against IncrementalFlowchart.update.
+    """
+    codes = [many_functions_code(n_funcs, edit=e) for e in (-1, n_funcs // 2)]
+    print(f'incremental: {n_funcs} functions, {codes[1].count(chr(10))} lines')
+
+    t_parse = best_time(lambda: ast.parse(codes[1]), repeat)
+    t_full = best_time(lambda: Flowchart.from_code(codes[1]), repeat)
+
+    inc = IncrementalFlowchart()
+    t_incremental = math.inf
+    for i in range(repeat):
+        inc.update(codes[i % 2])  # the previous version
+        t = time.perf_counter()
+        fc = inc.update(codes[(i + 1) % 2])  # edit one function
+        t_incremental = min(t_incremental, time.perf_counter() - t)
+
+    print(f'incremental: ast.parse only:    {t_parse * 1000:9.2f} ms')
+    print(f'incremental: full rebuild:      {t_full * 1000:9.2f} ms')
+    print(f'incremental: incremental build: {t_incremental * 1000:9.2f} ms '
+          f'(reused {inc.definitions.reused}, built {inc.definitions.built} definitions)')
+    print(f'incremental: emission:          {best_time(fc.flowchart, repeat) * 1000:9.2f} ms')
+
+
+# scenarios of the suite: name -> (code generator, size at scale=1, from_code options)
+SCENARIOS = {
+    'straight_line': (straight_line_code, 20000, {}),
+    'wide_if_chain': (wide_if_chain_code, 2000, {}),
+    'deep_loop_nesting': (nested_loops_code, 60, {}),
+    'many_small_functions': (lambda n: many_functions_code(n, lines_per_func=8), 2000, {}),
+    'large_class': (large_class_code, 500, {'field': 'Large', 'inner': True}),
+    'large_class_module': (large_class_code, 500, {}),
+    'with_heavy': (with_heavy_code, 1000, {}),
+}
+
+
+def run_scenario(code: str, repeat=3, **kwargs) -> dict:
+    """run_scenario measures the conversion of code.
+
+    Args:
+        code: str, Python code
+        repeat: timings are the best of `repeat` runs
+        **kwargs: options of Flowchart.from_code
+
+    Returns:
+        dict: lines, nodes, the wall times (seconds) of parse(), Flowchart.from_code() and Flowchart.flowchart(),
+            and peak_bytes: the peak memory (tracemalloc) of from_code() + flowchart()
+    """
+    field_kwargs = dict(kwargs)
+    field_ast = Flowchart.find_field_from_ast(ast.parse(code), field_kwargs.pop('field', ''))
+    body = field_ast.body if field_kwargs.pop('inner', True) else [field_ast]
+
+    fc = Flowchart.from_code(code, **kwargs)
+    result = {
+        'lines': code.count('\n'),
+        'nodes': node_count(lambda: Flowchart.from_code(code, **kwargs)),
+        'parse_s': best_time(lambda: parse(body, **field_kwargs), repeat),
+        'from_code_s': best_time(lambda: Flowchart.from_code(code, **kwargs), repeat),
+        'flowchart_s': best_time(fc.flowchart, repeat),
+    }
+    del fc
+
+    gc.collect()
+    tracemalloc.start()
+    Flowchart.from_code(code, **kwargs).flowchart()
+    result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result
+
+
+def run_suite(scale=1.0, repeat=3, names=None) -> dict:
+    """run_suite runs the SCENARIOS.
+
+    Args:
+        scale: float, multiplies the sizes of the scenarios
+        repeat: see run_scenario
+        names: scenarios to run, None for all
+
+    Returns:
+        dict: {"version", "python", "scale", "scenarios": {name: run_scenario result}}, JSON serializable
+    """
+    results = {}
+    for name, (generate, size, kwargs) in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        size = max(1, int(size * scale))
+        results[name] = dict(size=size, **run_scenario(generate(size), repeat, **kwargs))
+        r = results[name]
+        print(f'suite: {name:<22} size {size:>6}: {r["nodes"]:>7} nodes, '
+              f'parse {r["parse_s"] * 1000:8.2f} ms, from_code {r["from_code_s"] * 1000:8.2f} ms, '
+              f'flowchart {r["flowchart_s"] * 1000:8.2f} ms, peak {r["peak_bytes"] / 2 ** 20:7.1f} MiB')
+
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'scale': scale,
+        'scenarios': results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance=0.25) -> list:
+    """compare finds the regressions of suite results against baseline results (both from run_suite).
+
+    A time or peak memory over (1 + tolerance) times the baseline is a regression.
+    Node counts are deterministic: any change is reported.
+
+    Returns:
+        List[str]: regressions, empty if none
+    """
+    regressions = []
+    for name, r in results['scenarios'].items():
+        b = baseline.get('scenarios', {}).get(name)
+        if b is None or b.get('size') != r['size']:
+            print(f'compare: {name}: no baseline of size {r["size"]}')
+            continue
+
+        if r['nodes'] != b['nodes']:
+            regressions.append(f'{name}: nodes {b["nodes"]} -> {r["nodes"]}')
+        for metric in ('parse_s', 'from_code_s', 'flowchart_s', 'peak_bytes'):
+            ratio = r[metric] / b[metric] if b[metric] else 1.0
+            print(f'compare: {name:<22} {metric:<12} {ratio:6.2f}x baseline')
+            if ratio > 1 + tolerance:
+                regressions.append(f'{name}: {metric} {b[metric]:.6g} -> {r[metric]:.6g} ({ratio:.2f}x)')
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pyflowchart benchmarks.')
+    parser.add_argument('--suite', action="store_true", help="run the scenario suite (instead of the dev benchmarks)")
+    parser.add_argument('--import-time', action="store_true",
+                        help="check the import time of the CLI against its budget (instead of the dev benchmarks)")
+    parser.add_argument('--scenario', action="append", choices=list(SCENARIOS), help="scenario to run (repeatable)")
+    parser.add_argument('--scale', default=1.0, type=float, help="multiplies the sizes of the scenarios")
+    parser.add_argument('--repeat', default=3, type=int, help="timings are the best of REPEAT runs")
+    parser.add_argument('--json', default=None, type=str, help="file to save the suite results into")
+    parser.add_argument('--baseline', default=None, type=str, help="suite results (JSON) to compare against")
+    parser.add_argument('--tolerance', default=0.25, type=float,
+                        help="allowed slowdown / memory growth against the baseline (0.25: +25%%)")
+    args = parser.parse_args()
+
+    if args.import_time:
+        found = import_time_bench(repeat=args.repeat)
+        for problem in found:
+            print(f'REGRESSION {problem}')
+        sys.exit(1 if found else 0)
+
+    if not args.suite:
+        emission_scaling_bench()
+        nested_loops_bench()
+        node_memory_bench()
+        lean_memory_bench()
+        allocation_bench()
+        rerender_bench()
+        collapse_bench()
+        coalesce_bench()
+        text_work_bench()
+        decode_bench()
+        import_time_bench()
+        incremental_bench()
+        sys.exit(0)
+
+    suite_results = run_suite(args.scale, args.repeat, args.scenario)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(suite_results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = compare(suite_results, json.load(f), args.tolerance)
+        for regression in found:
+            print(f'REGRESSION {regression}')
+        sys.exit(1 if found else 0)
@@ -0,0 +1,164 @@
+"""
+This file defines FlowchartCache,
+a persistent on-disk cache of emitted flowchart DSL.
+
+Copyright 2020 CDFMLR. All rights reserved.
+Use of this source code is governed by a MIT
+license that can be found in the LICENSE file.
+"""
+
+import os
+
+from pyflowchart import __version__
+
+
+class FlowchartCache(object):
+    """
+    FlowchartCache stores emitted flowchart DSL in a directory, so that unchanged sources
+    are not parsed, built and emitted again (e.g. by the next CI run).
+
+    An entry is keyed by the hash of the source + field + options (inner, simplify, conds_align, stable_names,
+    coalesce, text budget) + the library version, so a new version of pyflowchart never reads entries of an old one.
+
+    The directory is bounded by max_bytes: when it grows over, the least recently used entries
+    (by mtime, refreshed on every hit) are evicted. Many processes may share a directory.
+    """
+
+    suffix = '.flowchart'
+
+    def __init__(self, cache_dir: str, max_bytes: int = 64 * 2 ** 20):
+        """FlowchartCache(cache_dir) uses (and creates if needed) the directory cache_dir.
+
+        Args:
+            cache_dir: str, path to the cache directory
+            max_bytes: int, size limit of the cache directory
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._size = None  # total size of entries, counted on the first put
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(source, field="", inner=True, simplify=False, conds_align=False, stable_names=False, coalesce=0,
+            max_text_chars=0, max_text_lines=0, max_depth=0, expand=()) -> str:
+        """key returns the cache key of given source & options.
+
+        Args:
+            source: str or bytes, the source code. bytes are hashed as is (no decoding needed).
+            field: str, see Flowchart.from_code. None: all functions (see FieldIndex.functions).
+            inner, simplify, conds_align, stable_names, coalesce, max_text_chars, max_text_lines, max_depth,
+                expand: see Flowchart.from_code
+
+        Returns:
+            str: a hex digest
+        """
+        import hashlib  # loads OpenSSL: for cached conversions only
+
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+        h = hashlib.blake2b(source, digest_size=20)
+        h.update(repr((field, bool(inner), bool(simplify), bool(conds_align), bool(stable_names),
+                       int(coalesce), int(max_text_chars), int(max_text_lines),
+                       int(max_depth), sorted(expand or ()), __version__)).encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + self.suffix)
+
+    def get(self, key: str):
+        """get returns the DSL cached for key, or None (a miss)."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                dsl = f.read()
+            os.utime(path)  # recently used
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return dsl
+
+    def put(self, key: str, dsl: str) -> None:
+        """put stores the DSL for key, then evicts old entries if the cache is oversize."""
+        import tempfile  # a heavy import (shutil, random...), for stores only: not for hits
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write & rename: readers (maybe in other processes) never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(dsl)
+        os.replace(tmp, path)
+        self.stores += 1
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += os.path.getsize(path)
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """_entries yields (mtime, size, path) of all entries in the cache directory."""
+        for d, _, files in os.walk(self.cache_dir):
+            for file in files:
+                if file.endswith(self.suffix):
+                    path = os.path.join(d, file)
+                    try:
+                        st = os.stat(path)
+                    except OSError:  # evicted by another process
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def evict(self) -> None:
+        """evict removes the least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self._entries())
+        size = sum(s for _, s, _ in entries)
+        for _, s, path in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            size -= s
+        self._size = size
+
+    def stats(self) -> dict:
+        """stats returns the hit/miss statistics of this FlowchartCache instance."""
+        return {'hits': self.hits, 'misses': self.misses, 'stores': self.stores, 'evictions': self.evictions}
+
+    def report(self) -> str:
+        """report returns the statistics as a line of text"""
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        return (f'cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), '
+                f'{self.stores} stores, {self.evictions} evictions')
+
+
+class CachedFlowchart(object):
+    """
+    CachedFlowchart is a flowchart emitted already (e.g. read from a FlowchartCache).
+
+    It has the emission methods of Flowchart: flowchart(), iter_lines() and write().
+    """
+
+    def __init__(self, dsl: str):
+        self.dsl = dsl
+
+    def flowchart(self) -> str:
+        return self.dsl
+
+    def iter_lines(self):
+        return iter(self.dsl.splitlines(keepends=True))
+
+    def write(self, fp, chunk_lines=1024) -> None:
+        fp.write(self.dsl)
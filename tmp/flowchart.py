@@ -7,9 +7,12 @@ license that can be found in the LICENSE file.
 """
 import _ast
 import ast
+import contextlib
+from typing import Tuple
 
-from pyflowchart.ast_node import parse
-from pyflowchart.node import Node, NodesGroup
+from pyflowchart.ast_node import parse, SourceSpan, CommonOperation, OptionPasses, Collapse
+from pyflowchart.cache import FlowchartCache, CachedFlowchart
+from pyflowchart.node import Node, NodesGroup, Connection, fc_edge, node_id_scope
 
 
 class Flowchart(NodesGroup):
@@ -19,6 +22,21 @@ class Flowchart(NodesGroup):
     Calls flowchart method of Flowchart instance to get a flowchart.js DSL.
     """
 
+    # BuildProfile timing the emission (flowchart & write), see from_code
+    profile = None
+
+    # (nodes before, nodes after) of the statement coalescing, see coalesce_operations
+    coalesced = None
+
+    # node name -> full text of the nodes whose texts are elided, see elide_texts
+    full_texts = None
+
+    # Collapse of a depth-limited build (see from_code max_depth): the statements collapsed, to expand
+    collapse = None
+
+    # the AST the nodes are named after (see name_nodes_by_position), when built with stable_names
+    stable_names_root = None
+
     def __init__(self, head_node: Node):
         """Flowchart is a graph of Node.
 
@@ -29,18 +47,83 @@ class Flowchart(NodesGroup):
     def flowchart(self) -> str:
         """flowchart returns a full flowchart starting from head Node.
 
-        Recursively get definitions & connections of current Node (self) and
+        Get definitions & connections of current Node (self) and
          all of its connections (sub Node) encountered,
          after which join everything together, returns the whole flowchart DSL as string.
 
+        For huge flowcharts, consider iter_lines() or write() instead.
+
         Returns:
             a flowchart.js DSL string including node definitions & connections
         """
+        with _stage(self.profile, 'emission'):
+            return ''.join(self.iter_lines())
+
+    def iter_lines(self):
+        """iter_lines yields the flowchart DSL incrementally: node definitions, a blank line, then connections.
+
+        Lines are generated on demand while walking the graph (twice), nothing else is held in memory.
+        ''.join(fc.iter_lines()) == fc.flowchart().
+
+        Yields:
+            str: a DSL line, ending with '\\n'
+        """
+        for item in self._iter_table():
+            if isinstance(item, Node):
+                yield item.fc_definition()
+
+        yield '\n'
+
+        for item in self._iter_table():
+            if not isinstance(item, Node):
+                yield fc_edge(*item)
+
+    def write(self, fp, chunk_lines=1024) -> None:
+        """write streams the flowchart DSL into a file-like object.
 
-        return self.fc_definition() + '\n' + self.fc_connection()
+        Lines are written in chunks of `chunk_lines` lines.
+
+        Args:
+            fp: a writable text file-like object, e.g. sys.stdout or open(path, 'w')
+            chunk_lines: int, lines per fp.write call
+
+        Returns:
+            None
+        """
+        with _stage(self.profile, 'emission'):
+            chunk = []
+            for line in self.iter_lines():
+                chunk.append(line)
+                if len(chunk) >= chunk_lines:
+                    fp.write(''.join(chunk))
+                    chunk.clear()
+            fp.write(''.join(chunk))
+
+    def expand(self, path: str) -> None:
+        """expand builds the statement collapsed at path (see from_code max_depth) into the flowchart,
+        in place of its summary node. The statements with a body in it are collapsed in turn.
+
+        The nodes added are neither coalesced nor elided. Node names: with stable_names, all nodes are
+        named by position again; otherwise the new nodes take new ids, the others keep their names.
+        So flowchart.expand(path) gives the flowchart of from_code(..., expand=[path]) (the names aside,
+        unless stable_names).
+
+        Args:
+            path: str, path of a collapsed statement, as shown in its summary. See ast_node.Collapse.
+                CollapsedPathError (a KeyError) if no statement is collapsed at path.
+        """
+        assert self.collapse is not None, "nothing to expand: not built with max_depth (or released by lean)"
+        self.collapse.expand(path)
+
+        if self.stable_names_root is not None:
+            name_nodes_by_position(self, self.stable_names_root)
+        else:
+            name_groups_after_heads(self)
 
     @staticmethod
-    def from_code(code: str, field: str = "", inner=True, simplify=False, conds_align=False):
+    def from_code(code: str, field: str = "", inner=True, simplify=False, conds_align=False, definitions=None,
+                  cache=None, stable_names=False, profile=None, lean=False, coalesce=0,
+                  max_text_chars=0, max_text_lines=0, max_depth=0, expand=()):
         """
         Get a Flowchart instance from a str of Python code.
 
@@ -51,9 +134,30 @@ class Flowchart(NodesGroup):
             inner: bool, True: parse the body of field; Field: parse the body as an object
             simplify: bool, for If & Loop statements: simplify the one-line-body or not.
             conds_align: bool, for consecutive If statements: conditionNode alignment support (Issue#14) or not
+            definitions: DefinitionCache, reuse subgraphs of unchanged definitions. See IncrementalFlowchart.
+            cache: FlowchartCache or str (path to a cache directory), reuse the DSL emitted for the same
+                code & options before, even by another process.
+            stable_names: bool, name nodes after the position of their statements (see name_nodes_by_position),
+                instead of the build order.
+            profile: BuildProfile, collects the timings & node counts of the stages of the conversion,
+                including the emission by the returned Flowchart.
+            lean: bool, release the AST once the graph is built, see release_ast.
+                For Flowcharts kept for a long time (e.g. in a server cache).
+            coalesce: int, merge runs of consecutive plain operations into blocks of up to
+                `coalesce` lines (see coalesce_operations). 0: do not merge. Not for definitions.
+            max_text_chars, max_text_lines: int, text budget of a node: longer texts are elided
+                (see elide_texts), the full texts are kept in Flowchart.full_texts. 0: no limit.
+                Not for definitions.
+            max_depth: int, build the statements with a body (def, class, if, for, while, with, try) down to
+                that depth only (1: the statements of the field), the deeper ones are collapsed into one
+                summary (subroutine) node each, nothing in them is built or unparsed. 0: no limit.
+                Not with definitions. See Flowchart.expand to expand a collapsed statement.
+            expand: List[str], with max_depth, paths of collapsed statements to build anyway
+                (e.g. "0.3.1", as shown in the summary nodes, see ast_node.Collapse).
 
         Returns:
             A Flowchart instance parsed from given code.
+            With cache, a CachedFlowchart instead: the emitted DSL, without the graph.
 
         `inner=True` means parse `field.body`, otherwise parse [field]. E.g.
 
@@ -91,23 +195,69 @@ class Flowchart(NodesGroup):
         - "Bar.buzz"
         - "Bar.buzz.g"
         """
-        code_ast = ast.parse(code)
+        if cache is not None:
+            if isinstance(cache, str):
+                cache = FlowchartCache(cache)
+            key = cache.key(code, field, inner, simplify, conds_align, stable_names, coalesce,
+                            max_text_chars, max_text_lines, max_depth, expand)
+            dsl = cache.get(key)
+            if dsl is None:
+                dsl = Flowchart.from_code(code, field, inner, simplify, conds_align, definitions,
+                                          stable_names=stable_names, profile=profile, coalesce=coalesce,
+                                          max_text_chars=max_text_chars, max_text_lines=max_text_lines,
+                                          max_depth=max_depth, expand=expand).flowchart()
+                cache.put(key, dsl)
+            return CachedFlowchart(dsl)
+
+        with _stage(profile, 'ast.parse'):
+            index = FieldIndex(ast.parse(code))
+
+        return index.flowchart(field,
+                               inner=inner,
+                               simplify=simplify,
+                               conds_align=conds_align,
+                               definitions=definitions,
+                               stable_names=stable_names,
+                               profile=profile,
+                               lean=lean,
+                               coalesce=coalesce,
+                               max_text_chars=max_text_chars,
+                               max_text_lines=max_text_lines,
+                               max_depth=max_depth,
+                               expand=expand)
 
-        field_ast = Flowchart.find_field_from_ast(code_ast, field)
+    @staticmethod
+    def from_code_fields(code: str, fields=None, inner=True, simplify=False, conds_align=False, stable_names=False,
+                         lean=False, coalesce=0, max_text_chars=0, max_text_lines=0, max_depth=0):
+        """
+        Get Flowchart instances of many fields from a str of Python code, parsing the code only once.
 
-        assert hasattr(field_ast, "body")
-        assert field_ast.body, f"{field}: nothing to parse. Check given code and field please."
+        Args:
+            code:  str,  Python code to draw flowcharts
+            fields: List[str], paths to fields (see from_code). None: all functions in code.
+            inner, simplify, conds_align, stable_names, lean, coalesce, max_text_chars, max_text_lines, max_depth:
+                see from_code
 
-        f = field_ast.body if inner else [field_ast]
-        p = parse(f, simplify=simplify, conds_align=conds_align)
-        return Flowchart(p.head)
+        Returns:
+            Dict[str, Flowchart]: field => Flowchart, in the order of given fields
+        """
+        return FieldIndex(ast.parse(code)).flowcharts(fields,
+                                                      inner=inner,
+                                                      simplify=simplify,
+                                                      conds_align=conds_align,
+                                                      stable_names=stable_names,
+                                                      lean=lean,
+                                                      coalesce=coalesce,
+                                                      max_text_chars=max_text_chars,
+                                                      max_text_lines=max_text_lines,
+                                                      max_depth=max_depth)
 
     @staticmethod
     def find_field_from_ast(ast_obj: _ast.AST, field: str) -> _ast.AST:
         """Find a field from AST.
 
         This function finds the given `field` in `ast_obj.body`, return the found AST object
-        or an `_ast.AST` object whose body attribute is [].
+        or an `_ast.AST` object whose body attribute is []. ast_obj is not modified.
         Specially, if field="", returns `ast_obj`.
 
         A field is the *path* to a `def` code block in code (i.e. a `FunctionDef` object in AST). E.g.
@@ -139,19 +289,483 @@ class Flowchart(NodesGroup):
             ast_obj: given AST
             field: path to a `def`
 
+        To find many fields in the same AST, build a FieldIndex once instead.
+
         Returns: an _ast.AST object
         """
-        if field == "":
-            return ast_obj
+        field_ast = FieldIndex(ast_obj).get(field)
+        if field_ast is None:
+            field_ast = ast.Module(body=[], type_ignores=[])
+        return field_ast
+
+
+def _stage(profile, stage: str):
+    """_stage returns profile.stage(stage), or a no-op context manager if profile is None."""
+    if profile is None:
+        return contextlib.nullcontext({})
+    return profile.stage(stage)
+
+
+class _CountedIds(object):
+    """_CountedIds passes the ids of a node id counter (see node_id_scope) through, counting the ones taken."""
+    __slots__ = ('ids', 'taken')
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.taken = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> int:
+        self.taken += 1
+        return next(self.ids)
+
 
-        field_list = field.split('.')
-        try:
-            for fd in field_list:
-                for ao in ast_obj.body:  # raises AttributeError: ast_obj along the field path has no body
-                    if hasattr(ao, 'name') and ao.name == fd:
-                        ast_obj = ao
-            assert ast_obj.name == field_list[-1], "field not found"
-        except (AttributeError, AssertionError):
-            ast_obj.body = []
+# name prefixes of nodes, by node_type (as StartNode, EndNode, ... name their nodes)
+NODE_NAME_PREFIXES = {
+    'start': 'st',
+    'end': 'e',
+    'operation': 'op',
+    'inputoutput': 'io',
+    'subroutine': 'sub',
+    'condition': 'cond',
+}
+
+
+def name_nodes_by_position(flowchart: Flowchart, root: _ast.AST) -> None:
+    """name_nodes_by_position renames the nodes of a flowchart built from root (a Module or a field)
+    after the position of their statements, instead of the build order.
+
+    A node of a statement is named `{scope.}{prefix}{line}_{col}`, where scope is the path of the
+    enclosing def/class (relative to root), and line is relative to the first line of that def/class.
+    Nodes of a def itself (start, args, end) are named `{scope.}{def name}.{prefix}`. E.g.
+
+        x = 1                 # op1_0
+        def foo(a):           # foo.st, foo.io, foo.e
+            if a:             # foo.cond1_4
+                print(a)      # foo.sub2_8
+
+    So identical code always gets byte-identical DSL, and editing a def
+    does not rename the nodes in the other ones (only the module-level lines below it shift).
+
+    Nodes of no statement (e.g. the no-op of an empty loop) are named after the node walked before them.
+    A name that is already taken gets a `_2`, `_3`, ... suffix.
+    """
+    # id(ast object) -> (head, tail): name = head + prefix + tail
+    stems = {id(root): ('', '')}
+    stack = [(root, '', getattr(root, 'lineno', 0))]
+    while stack:
+        ast_obj, scope, base = stack.pop()
+        for child in ast.iter_child_nodes(ast_obj):
+            if isinstance(child, _ast.expr):  # no statements in expressions
+                continue
+            head = scope + '.' if scope else ''
+            if isinstance(child, (_ast.FunctionDef, _ast.AsyncFunctionDef, _ast.ClassDef)):
+                stems[id(child)] = (head + child.name + '.', '')
+                stack.append((child, head + child.name, child.lineno))
+            else:
+                if isinstance(child, (_ast.stmt, _ast.excepthandler)):
+                    stems[id(child)] = (head, f'{child.lineno - base}_{child.col_offset}')
+                stack.append((child, scope, base))
+
+    taken = set()
+    last = ''
+    groups = []
+    for node in flowchart._iter_table():
+        if not isinstance(node, Node):
+            groups.extend(n for n in node[:2] if isinstance(n, NodesGroup))
+            continue
+
+        prefix = NODE_NAME_PREFIXES.get(node.node_type, node.node_type)
+        stem = stems.get(id(getattr(node, 'ast_object', None)))
+        name = stem[0] + prefix + stem[1] if stem is not None else f'{last}_{prefix}'
+
+        unique, k = name, 1
+        while unique in taken:
+            k += 1
+            unique = f'{name}_{k}'
+        taken.add(unique)
+
+        node.node_name = last = unique
+
+    _name_groups(groups)
+
+
+def name_groups_after_heads(flowchart: Flowchart) -> None:
+    """name_groups_after_heads names the NodesGroups entered by the edges of a flowchart after their heads again,
+    e.g. after their heads are replaced (see Flowchart.expand)."""
+    groups = []
+    for item in flowchart._iter_table():
+        if not isinstance(item, Node):
+            groups.extend(n for n in item[:2] if isinstance(n, NodesGroup))
+    _name_groups(groups)
+
+
+def _name_groups(groups: list) -> None:
+    # a NodesGroup is named after its head, see NodesGroup.__init__
+    for group in groups:
+        head = group.head
+        while isinstance(head, NodesGroup):
+            head = head.head
+        group.node_name = head.node_name
+
+
+# flowchart.js joins a DSL line without these to the line before, i.e. continues the text of the node above
+DSL_LINE_MARKERS = ('=>', '->', '@>')
+
+
+def coalesce_operations(flowchart: Flowchart, max_lines: int) -> Tuple[int, int]:
+    """coalesce_operations merges each maximal run of consecutive plain operations (CommonOperation nodes,
+    A -> B -> C, where B and C are entered from the node above only) into a block: one node of
+    up to max_lines lines of text (flowchart.js draws a multi-line box). E.g.
+
+        x = 1                 op1=>operation: x = 1
+        y = 2         =>      y = 2
+        z = x + y             z = x + y
+
+    The block is the first node of the run, it takes the outgoing connections of the last one.
+    Nodes whose text would break the DSL as a continuation line (see DSL_LINE_MARKERS) are not merged.
+
+    The graph is rewritten in place. Built from DefinitionCache (IncrementalFlowchart), it must not be:
+    the cached subgraphs are shared by later builds.
+
+    Args:
+        flowchart: Flowchart to rewrite
+        max_lines: int, maximum number of lines (statements) of a block
+
+    Returns:
+        (number of nodes before, number of nodes after)
+    """
+    nodes = []
+    incoming = {}  # id(node) -> number of edges into it
+    head = flowchart.head
+    while isinstance(head, NodesGroup):
+        head = head.head
+    incoming[id(head)] = 1  # the head is entered from the outside
+
+    for item in flowchart._iter_table():
+        if isinstance(item, Node):
+            nodes.append(item)
+            continue
+        dst = item[1]
+        while isinstance(dst, NodesGroup):
+            dst = dst.head
+        incoming[id(dst)] = incoming.get(id(dst), 0) + 1
+
+    def next_operation(node):
+        """the only next node of node if it is a plain operation entered from node only, else None"""
+        connections = node._connections
+        if not connections or len(connections) != 1 or not isinstance(connections[0], Node):
+            return None
+        sub = connections[0]
+        while isinstance(sub, NodesGroup):
+            sub = sub.head
+        if not isinstance(sub, CommonOperation) or incoming.get(id(sub)) != 1 or \
+                any(marker in sub.node_text for marker in DSL_LINE_MARKERS):
+            return None
+        return sub
+
+    merged = set()  # ids of the nodes merged into blocks
+    for node in nodes:
+        if not isinstance(node, CommonOperation) or id(node) in merged:
+            continue
+
+        texts = [node.node_text]
+        last = node
+        while len(texts) < max_lines:
+            sub = next_operation(last)
+            if sub is None:
+                break
+            texts.append(sub.node_text)
+            merged.add(id(sub))
+            last = sub
+
+        if last is not node:
+            node.node_text = '\n'.join(texts)
+            node.connections = list(last._connections or ())
+            node.connect_direction = last.connect_direction
+
+    return len(nodes), len(nodes) - len(merged)
+
+
+# marks the end of an elided text
+ELISION = '...'
+
+
+def elide_text(text: str, max_chars=0, max_lines=0) -> str:
+    """elide_text cuts text down to max_lines lines and max_chars characters (0: no limit),
+    ending it with ELISION if anything is cut. The same text & budget always give the same result.
+
+        elide_text('x = [1, 2, 3, 4]', max_chars=10)  # 'x = [1,...'
+    """
+    lines = text.split('\n')
+    elided = False
+    if max_lines and len(lines) > max_lines:
+        lines = lines[:max_lines]
+        elided = True
+    text = '\n'.join(lines)
+    if max_chars and len(text) + (len(ELISION) if elided else 0) > max_chars:
+        text = text[:max(max_chars - len(ELISION), 0)]
+        elided = True
+    return text + ELISION if elided else text
+
+
+def elide_texts(flowchart: Flowchart, max_chars=0, max_lines=0) -> dict:
+    """elide_texts applies a text budget (see elide_text) to all nodes of flowchart, in place.
+
+    Run it after the nodes are named (e.g. after name_nodes_by_position):
+    the full texts are returned by node name.
+
+    Returns:
+        Dict[str, str]: node name -> full text, of the nodes elided
+    """
+    full_texts = {}
+    for node in flowchart._iter_table():
+        if not isinstance(node, Node):
+            continue
+        text = elide_text(node.node_text, max_chars, max_lines)
+        if text != node.node_text:
+            full_texts[node.node_name] = node.node_text
+            node.node_text = text
+    return full_texts
+
+
+def release_ast(flowchart: Flowchart) -> None:
+    """release_ast replaces the ast_object of all nodes in flowchart with its SourceSpan (line & column range).
+
+    Nodes keep their texts, so the flowchart is emitted as before, but the graph no longer pins
+    the AST (with all nested bodies) it was built from. Nodes of the same statement share one SourceSpan.
+    Methods that need the AST (e.g. AstNode.ast_to_source) are no longer usable on the released nodes.
+    """
+    spans = {}  # id(ast object) -> (ast object, SourceSpan), the ast object is kept to keep the id valid
+
+    def release(obj) -> None:
+        ast_object = getattr(obj, 'ast_object', None)
+        if isinstance(ast_object, _ast.AST):
+            if id(ast_object) not in spans:
+                spans[id(ast_object)] = (ast_object, SourceSpan.of(ast_object))
+            obj.ast_object = spans[id(ast_object)][1]
+
+    # NodesGroups are transparent to the graph walks, and may hold nodes out of the graph
+    # (e.g. the condition node replaced by a simplification, the end of a function that returns):
+    # sweep everything referenced by nodes & groups instead.
+    stack = [flowchart]
+    seen = set()
+    while stack:
+        obj = stack.pop()
+        if obj is None or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        if isinstance(obj, Connection):
+            stack.append(obj.dst)
+            continue
+
+        release(obj)
+        stack.extend(obj._connections or ())
+        if isinstance(obj, NodesGroup):
+            for value in vars(obj).values():
+                stack.extend(v for v in (value if isinstance(value, list) else [value])
+                             if isinstance(v, (Node, Connection)))
+
+
+class FieldIndex(object):
+    """
+    FieldIndex maps every field (path to a `def`/`class`, e.g. `Class.method.inner`)
+    of an AST to its AST object. See Flowchart.from_code for fields.
 
-        return ast_obj
+    The index is built once, then many fields can be looked up & converted
+    without re-parsing the code. When a name is defined more than once in a body,
+    the last definition wins (as the name binding in Python does).
+    """
+
+    def __init__(self, ast_obj: _ast.AST):
+        """FieldIndex(ast_obj) indexes all fields in ast_obj (usually an ast.Module).
+
+        The AST is not modified.
+        """
+        self.fields = {"": ast_obj}
+
+        stack = [("", ast_obj)]
+        while stack:
+            prefix, obj = stack.pop()
+
+            children = {}
+            for ao in getattr(obj, 'body', ()):
+                name = getattr(ao, 'name', None)
+                if isinstance(name, str):
+                    children[name] = ao  # last wins
+
+            for name, ao in children.items():
+                field = prefix + name
+                self.fields[field] = ao
+                stack.append((field + '.', ao))
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.fields
+
+    def __getitem__(self, field: str) -> _ast.AST:
+        return self.fields[field]
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def get(self, field: str, default=None):
+        return self.fields.get(field, default)
+
+    def functions(self):
+        """functions returns fields of all functions (`def` & `async def`, including methods
+        and nested functions), in source order.
+
+        Returns:
+            List[str]: fields
+        """
+        functions = [(ao.lineno, ao.col_offset, field) for field, ao in self.fields.items()
+                     if isinstance(ao, (_ast.FunctionDef, _ast.AsyncFunctionDef))]
+        return [field for _, _, field in sorted(functions)]
+
+    def flowchart(self, field: str = "", inner=True, simplify=False, conds_align=False, definitions=None,
+                  stable_names=False, profile=None, lean=False, coalesce=0, max_text_chars=0, max_text_lines=0,
+                  passes=None, max_depth=0, expand=()):
+        """flowchart converts the given field into a Flowchart.
+
+        Args:
+            passes: OptionPasses, records the If & Loop groups built, to apply simplify & conds_align later
+                (see FlowchartRenderer). Build with both off then. Not with definitions.
+            others: see Flowchart.from_code
+
+        Returns:
+            A Flowchart instance of the field.
+        """
+        field_ast = self.fields.get(field)
+
+        assert field_ast is not None and field_ast.body, \
+            f"{field}: nothing to parse. Check given code and field please."
+
+        f = field_ast.body if inner else [field_ast]
+        collapse = None
+        if max_depth:
+            assert definitions is None and passes is None, "max_depth: not with definitions, passes"
+            collapse = Collapse(f, max_depth, expand)
+        # node ids of its own: the names do not depend on other (maybe concurrent) builds
+        with node_id_scope() as ids, _stage(profile, 'build') as measure:
+            if profile is not None:  # count the ids taken by the build, the names stay the same
+                ids = _CountedIds(ids)
+            if passes is not None:
+                assert definitions is None, "passes: not with definitions, the subgraphs would be shared"
+            with node_id_scope(ids):
+                if collapse is not None:
+                    collapse.ids = ids  # expansions continue the ids
+                    p = parse(f, simplify=simplify, conds_align=conds_align, collapse=collapse)
+                else:
+                    p = parse(f, simplify=simplify, conds_align=conds_align, definitions=definitions, passes=passes)
+                flowchart = Flowchart(p.head)
+            if profile is not None:
+                measure['nodes'] = ids.taken
+
+        if coalesce:
+            with _stage(profile, 'coalesce') as measure:
+                flowchart.coalesced = coalesce_operations(flowchart, coalesce)
+                measure['nodes'] = flowchart.coalesced[0] - flowchart.coalesced[1]  # nodes removed
+
+        if stable_names:
+            with _stage(profile, 'stable_names'):
+                name_nodes_by_position(flowchart, field_ast)
+            flowchart.stable_names_root = field_ast
+
+        if max_text_chars or max_text_lines:
+            flowchart.full_texts = elide_texts(flowchart, max_text_chars, max_text_lines)
+
+        if lean:
+            release_ast(flowchart)
+            flowchart.stable_names_root = None
+        elif collapse is not None:
+            flowchart.collapse = collapse
+
+        flowchart.profile = profile
+        return flowchart
+
+    def flowcharts(self, fields=None, inner=True, simplify=False, conds_align=False, stable_names=False,
+                   lean=False, coalesce=0, max_text_chars=0, max_text_lines=0, max_depth=0):
+        """flowcharts converts many fields into Flowcharts.
+
+        Args:
+            fields: List[str], fields to convert. None: all functions, see functions().
+            inner, simplify, conds_align, stable_names, lean, coalesce, max_text_chars, max_text_lines, max_depth:
+                see Flowchart.from_code
+
+        Returns:
+            Dict[str, Flowchart]: field => Flowchart, in the order of fields
+        """
+        if fields is None:
+            fields = self.functions()
+        return {field: self.flowchart(field, inner=inner, simplify=simplify, conds_align=conds_align,
+                                      stable_names=stable_names, lean=lean, coalesce=coalesce,
+                                      max_text_chars=max_text_chars, max_text_lines=max_text_lines,
+                                      max_depth=max_depth)
+                for field in fields}
+
+
+class FlowchartRenderer(object):
+    """
+    FlowchartRenderer renders (a field of) a code with any simplify & conds_align options,
+    parsing & building its graph once only.
+
+    The graph is built with both options off (the base graph), then each render applies the options
+    as passes on it (see OptionPasses): switching options costs the passes & the emission only. E.g.
+
+        renderer = FlowchartRenderer(code, field='foo')
+        renderer.flowchart(simplify=True)
+        renderer.flowchart(simplify=False, conds_align=True)  # no ast.parse, no build
+
+    The flowcharts are the ones of Flowchart.from_code with the same options,
+    but the simplified nodes are named after their conditions (as If.simplify does).
+    """
+
+    def __init__(self, code: str, field: str = "", inner=True, stable_names=False, profile=None):
+        """FlowchartRenderer(code, field) parses code and builds the base graph of field.
+
+        Args:
+            code, field, inner, stable_names, profile: see Flowchart.from_code
+        """
+        with _stage(profile, 'ast.parse'):
+            index = FieldIndex(ast.parse(code))
+
+        self.passes = OptionPasses()
+        self.stable_names = stable_names
+        self.profile = profile
+        self._field_ast = index[field]
+        self._options = (False, False)  # (simplify, conds_align) of the graph
+
+        self._flowchart = index.flowchart(field, inner=inner, stable_names=stable_names, profile=profile,
+                                          passes=self.passes)
+
+    def render(self, simplify=False, conds_align=False) -> Flowchart:
+        """render applies the options to the graph.
+
+        The same Flowchart (graph) is returned by every render: a render changes the ones returned before.
+
+        Returns:
+            Flowchart
+        """
+        if (simplify, conds_align) != self._options:
+            with _stage(self.profile, 'passes'):
+                if simplify != self._options[0]:
+                    self.passes.simplify(simplify)
+                if conds_align != self._options[1]:
+                    self.passes.conds_align(conds_align)
+            self._options = (simplify, conds_align)
+
+            if self.stable_names:  # simplified nodes are named after their statements too
+                with _stage(self.profile, 'stable_names'):
+                    name_nodes_by_position(self._flowchart, self._field_ast)
+
+        return self._flowchart
+
+    def flowchart(self, simplify=False, conds_align=False) -> str:
+        """flowchart renders the graph with given options, and returns the flowchart DSL."""
+        return self.render(simplify, conds_align).flowchart()
@@ -0,0 +1,217 @@
+"""
+This file defines IncrementalFlowchart,
+which re-flowcharts edited sources reusing the unchanged definitions.
+
+Copyright 2020 CDFMLR. All rights reserved.
+Use of this source code is governed by a MIT
+license that can be found in the LICENSE file.
+"""
+
+import _ast
+import ast
+import gc
+import itertools
+
+from pyflowchart.ast_node import FunctionDefStart
+from pyflowchart.flowchart import Flowchart
+from pyflowchart.node import Node, NodesGroup, Connection, node_id_scope
+
+
+class DefinitionCache(object):
+    """
+    DefinitionCache keeps the subgraphs built for definitions (def, class) of the previous build,
+    content-addressed by the hash of their source code.
+
+    It is used by ast_node.parse(..., definitions=cache): a definition whose source is unchanged
+    since the previous build gets its previous subgraph back, instead of being parsed again.
+    Definitions nested in another one (e.g. methods in a class) are cached as well.
+    """
+
+    definition_types = (_ast.FunctionDef, _ast.AsyncFunctionDef, _ast.ClassDef)
+
+    def __init__(self):
+        self._entries = {}  # key -> (node, nested_keys): the previous build
+        self._kept = {}  # key -> (node, nested_keys): the running build
+        self._kept_order = []  # keys in self._kept, in the order kept
+        self._building = []  # stack of (key, len(self._kept_order)): definitions being built
+        self._source_lines = []
+
+        self.reused = 0  # definitions reused in the last build
+        self.built = 0  # definitions built in the last build
+
+        # point the ast_object of reused nodes to the (equal) AST objects of the running build,
+        # for passes that look nodes up in the new AST (e.g. stable_names). Costs a walk of every reused subgraph.
+        self.rebind_ast = False
+
+    def start(self, code: str) -> None:
+        """start a build of given source code"""
+        self._source_lines = code.splitlines(keepends=True)
+        self._kept, self._kept_order, self._building = {}, [], []
+        self.reused = self.built = 0
+
+    def finish(self) -> None:
+        """finish the running build: only the definitions in it are kept for the next build"""
+        self._entries = self._kept
+        self._kept, self._kept_order, self._building = {}, [], []
+        self._source_lines = []
+
+    def key(self, ast_object: _ast.AST) -> bytes:
+        """key is the hash of the source code of given definition"""
+        import hashlib  # loads OpenSSL: for incremental builds only
+
+        text = ''.join(self._source_lines[ast_object.lineno - 1:ast_object.end_lineno])
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def reuse(self, ast_object: _ast.AST):
+        """reuse returns the previous subgraph of given definition if its source is unchanged, otherwise None.
+
+        A None returned means the caller is going to build it, and keep() it after that.
+        """
+        if not isinstance(ast_object, self.definition_types):
+            return None
+
+        key = self.key(ast_object)
+        entry = self._entries.get(key)
+
+        # the same source may appear twice, but a subgraph can only be used once
+        if entry is not None and key not in self._kept:
+            node, nested_keys = entry
+            _detach(node)
+            new_objects = _rebind_ast(node, ast_object) if self.rebind_ast else {}
+            self._keep(key, entry)
+            for k in nested_keys:  # they are reused (inside node) as well
+                if k in self._entries and k not in self._kept:
+                    self._keep(k, self._entries[k])
+                    nested = self._entries[k][0]  # a NodesGroup, not met by the walk of _rebind_ast
+                    nested.ast_object = new_objects.get(id(nested.ast_object), nested.ast_object)
+            self.reused += 1
+            return node
+
+        self._building.append((key, len(self._kept_order)))
+        return None
+
+    def keep(self, ast_object: _ast.AST, node: Node) -> None:
+        """keep the subgraph just built for given definition (after a reuse() returns None)"""
+        if not isinstance(ast_object, self.definition_types):
+            return
+
+        key, start = self._building.pop()
+        self._keep(key, (node, self._kept_order[start:]))
+        self.built += 1
+
+    def _keep(self, key: bytes, entry: tuple) -> None:
+        self._kept[key] = entry
+        self._kept_order.append(key)
+
+
+def _rebind_ast(node: Node, ast_object: _ast.AST) -> dict:
+    """
+    _rebind_ast points the nodes of a (detached) previously built subgraph to the statements of ast_object,
+    a new AST of the same source code as the one it was built from.
+
+    Returns:
+        dict: id(old AST object) -> new AST object
+    """
+    # the two ASTs have the same shape: pair their statements up
+    new_objects = {}
+    stack = [(node.ast_object, ast_object)]
+    while stack:
+        old, new = stack.pop()
+        new_objects[id(old)] = new
+        stack.extend((o, n) for o, n in zip(ast.iter_child_nodes(old), ast.iter_child_nodes(new))
+                     if not isinstance(o, _ast.expr))
+
+    node.ast_object = ast_object
+    for n in node._walk(next(Node._visited_flag)):
+        if isinstance(n, Node):
+            new = new_objects.get(id(getattr(n, 'ast_object', None)))
+            if new is not None:
+                n.ast_object = new
+
+    return new_objects
+
+
+def _detach(node: Node) -> None:
+    """
+    _detach disconnects the tails of a previously built subgraph from what followed them,
+    so that it can be connected into a new graph.
+    """
+    stack = [node]
+    while stack:
+        t = stack.pop()
+        if isinstance(t, NodesGroup):
+            stack.extend(t.tails)
+        elif isinstance(t, Connection):
+            t.dst = None
+            t.direction = None
+        elif isinstance(t, FunctionDefStart):  # the tail of a method (see ClassDef): keep its body
+            del t.connections[1:]
+        elif isinstance(t, Node):
+            t.connections = None
+            t.connect_direction = None
+
+
+class IncrementalFlowchart(object):
+    """
+    IncrementalFlowchart converts successive versions of a source code (e.g. while it is being edited)
+    into Flowcharts, reusing the subgraphs of unchanged definitions (def, class) from the previous version.
+
+    A one-line edit then costs graph building proportional to the edited definition
+    (plus ast.parse & emission, which are linear and cheap in comparison).
+
+    Notice that update() reuses parts of the previous graph: a Flowchart returned by update()
+    should no longer be used after the next update().
+
+    Usage:
+
+        inc = IncrementalFlowchart(simplify=True)
+        fc = inc.update(code)
+        ...
+        fc = inc.update(edited_code)
+    """
+
+    def __init__(self, field: str = "", inner=True, simplify=False, conds_align=False, stable_names=False):
+        """
+        Args: see Flowchart.from_code
+        """
+        self.field = field
+        self.inner = inner
+        self.simplify = simplify
+        self.conds_align = conds_align
+        self.stable_names = stable_names
+
+        self.definitions = DefinitionCache()
+        self.definitions.rebind_ast = stable_names
+        # node ids continue across updates: reused subgraphs keep theirs, new nodes must not collide
+        self._node_ids = itertools.count(0)
+
+    def update(self, code: str) -> Flowchart:
+        """
+        update gets a Flowchart instance from the new version of code.
+
+        Args:
+            code: str, Python code to draw flowchart
+
+        Returns:
+            A Flowchart instance parsed from given code.
+        """
+        # The previous graph is kept alive between updates: with it, the cyclic GC triggered again and again
+        # by the allocations of ast.parse rescans a big heap, and costs more than the parsing itself.
+        # Nothing built here is garbage, so the GC is paused during the update.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+
+        self.definitions.start(code)
+        try:
+            with node_id_scope(self._node_ids):
+                return Flowchart.from_code(code,
+                                           field=self.field,
+                                           inner=self.inner,
+                                           simplify=self.simplify,
+                                           conds_align=self.conds_align,
+                                           stable_names=self.stable_names,
+                                           definitions=self.definitions)
+        finally:
+            self.definitions.finish()
+            if gc_enabled:
+                gc.enable()
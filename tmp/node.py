@@ -8,43 +8,105 @@ Use of this source code is governed by a MIT
 license that can be found in the LICENSE file.
 """
 
-import time
-import uuid
+import contextlib
+import contextvars
 import itertools  # for count
+from typing import List, Tuple
 
 
-# TODO(v1.0): Noticing that all connections look like `xxx(params)->yyy`,
-#       where params maybe something like `right`, `yes`, or `yes,right`,
-#       A good idea is to make a new class Connection as:
-#           class Connection(object):
-#               next_node: Node
-#               params: dict
-#       It helps to customize the directions of connections and we may not even
-#       need a CondYN anymore!
-#       But this changes a lot and seems not necessary now. So it's maybe a
-#       further version 1.0 job to achieve this.
+# Connections look like `xxx(params)->yyy`, where params maybe something like `right`, `yes`, or `yes,right`.
+# A plain connection is stored as the next Node itself in `node.connections` (params: the `connect_direction`
+# of the node), while a labelled one (condition yes|no) is stored as a compact Connection record.
+# A Flowchart flattens all of them into an edge table of (src, dst, label, direction) to emit the DSL.
+
+# id counter of the running build, see node_id_scope. None: out of any build.
+_node_ids = contextvars.ContextVar('pyflowchart_node_ids', default=None)
+
+
+@contextlib.contextmanager
+def node_id_scope(counter=None):
+    """node_id_scope makes the Nodes created in the with-block take their ids from a counter of their own,
+    instead of the process-wide Node._node_id.
+
+    The counter is held in a contextvar, so builds in different threads (or asyncio tasks)
+    are independent: a build gets the same node names whatever runs concurrently or ran before.
+
+        with node_id_scope():
+            p = parse(body)  # node names start from 0
+
+    Args:
+        counter: an iterator of ids (e.g. itertools.count()), to continue the ids of former builds.
+            None: keep the counter of the enclosing node_id_scope if any, otherwise start a new one from 0.
+    """
+    if counter is None:
+        counter = _node_ids.get()
+        if counter is None:
+            counter = itertools.count(0)
+
+    token = _node_ids.set(counter)
+    try:
+        yield counter
+    finally:
+        _node_ids.reset(token)
+
 
 class Node(object):
     """Node is a abstract class for kinds of flowchart node.
+
+    Nodes are slotted (no per-instance __dict__) to keep large graphs compact.
+    Subclasses should declare `__slots__` as well (`()` if they add no attributes),
+    except NodesGroups, which are few and keep a __dict__.
     """
     node_type = 'node'  # flowchart.js Node Syntax: nodeType
 
+    # ast_object is set by AstNode (and nodes standing for a statement, e.g. simplified If/Loop) only.
+    # It is declared here rather than on AstNode,
+    # so that the AstNode mixin can be combined with slotted Node subclasses (e.g. ConditionNode).
+    __slots__ = ('id', 'node_name', 'node_text', 'connect_direction', 'ast_object',
+                 '_connections', '_params', '__visited')
+
     # object id: an iterator
-    # each entities call next(self._node_id) to get an ID.
-    # XXX: I am not fully sure that this is thread-safe.
+    # each entities call next() on the id counter of the running build (see node_id_scope) to get an ID.
+    # Nodes created out of any build (e.g. by hand) share this process-wide counter.
     _node_id = itertools.count(0)
 
+    # visited flags for _traverse: each traversal takes a new one
+    _visited_flag = itertools.count(1)
+
     def __init__(self):
         self.node_name = ''  # flowchart.js Node Syntax: nodeName
         self.node_text = ''  # flowchart.js Node Syntax: nodeText
-        self.connections = []  # list<Node>, connected (next / sub) nodes.
+        self._connections = None  # list<Node>, connected (next / sub) nodes. Allocated on first use.
 
-        self.params = {}  # flowchart.js #115 e.g. `element(param1=value1,param2=value2)=>start: Start`
+        self._params = None  # flowchart.js #115 e.g. `element(param1=value1,param2=value2)=>start: Start`
         self.connect_direction = None  # custom thisNode(connect_direction)->nextNode
 
         self.__visited = None
 
-        self.id = next(self._node_id)
+        ids = _node_ids.get()
+        self.id = next(ids if ids is not None else self._node_id)
+
+    @property
+    def connections(self) -> list:
+        """list<Node>: connected (next / sub) nodes."""
+        if self._connections is None:
+            self._connections = []
+        return self._connections
+
+    @connections.setter
+    def connections(self, connections: list):
+        self._connections = connections
+
+    @property
+    def params(self) -> dict:
+        """dict: `(param=value)`s, see set_param."""
+        if self._params is None:
+            self._params = {}
+        return self._params
+
+    @params.setter
+    def params(self, params: dict):
+        self._params = params
 
     def fc_definition(self) -> str:
         """fc_definition returns the flowchart.js node definition string of current Node  (self only, subs excepted).
@@ -58,8 +120,8 @@ class Node(object):
             str
         """
         params = ''
-        if self.params:
-            params = ','.join((f'{k}={self.params[k]}' for k in self.params))  # 'param1=value1,param2=value2'
+        if self._params:
+            params = ','.join((f'{k}={self._params[k]}' for k in self._params))  # 'param1=value1,param2=value2'
             params = f'({params})'
 
         return f'{self.node_name}{params}=>{self.node_type}: {self.node_text}\n'
@@ -70,38 +132,91 @@ class Node(object):
         Returns:
             a flowchart.js node connection string: "node_name->sub_node_name"
         """
-        fc_conn_str = ''
-        for connection in self.connections:
-            if isinstance(connection, Node):
-                specification = f'({self.connect_direction})' if self.connect_direction else ""
-                fc_conn_str += f'{self.node_name}{specification}->{connection.node_name}\n'
-        return fc_conn_str
-
-    def _traverse(self, func, visited_flag) -> None:
+        return ''.join(fc_edge(*edge) for edge in self.edges())
+
+    def edges(self) -> list:
+        """edges returns the outgoing connections of current Node as edge records.
+
+        Returns:
+            list<(src, dst, label, direction)>, dangling connections (dst is None) excepted.
+        """
+        edges = []
+        for c in self._connections or ():
+            if isinstance(c, Node):
+                edges.append((self, c, None, self.connect_direction))
+            elif c.dst is not None:
+                edges.append(c.edge())
+        return edges
+
+    def _traverse(self, func, visited_flag, connection_func=None) -> None:
         """_traverse walking the Node graph, visiting each Node, calls func(self).
 
+        See _walk for the order of visiting.
+
         Args:
             func: function(node Node) -> bool: a function to be called on every Node.
-                Stop traverse if func returns False
+                Stop traverse (from that Node) if func returns False
             visited_flag: something tags visited nodes.
                 The graph of Nodes maybe not an acyclic graph.
                 In this case, a visited_flag is necessary to
-                avoid the infinite recursion.
+                avoid the infinite loop.
+            connection_func: function(connection Connection): called on every Connection record
+                (e.g. condition yes|no) when the walk goes through it. Optional.
 
         Returns:
             None
         """
-        if self.__visited == visited_flag:
-            return
+        walk = self._walk(visited_flag)
+        try:
+            item = next(walk)
+            while True:
+                if isinstance(item, Connection):
+                    if connection_func is not None:
+                        connection_func(item)
+                    item = next(walk)
+                else:
+                    item = walk.send(bool(func(item)))
+        except StopIteration:
+            pass
+
+    def _walk(self, visited_flag):
+        """_walk is a generator walking the Node graph, yields each Node and Connection record met.
+
+        The walk is a depth-first (pre-order) search driven by an explicit stack,
+        so the Python stack usage is constant no matter how long or deep the graph is.
+        NodesGroups met along the way are transparent: the walk goes on from their head.
+
+        Send False (instead of next) to the generator to stop walking from the Node just yielded.
 
-        self.__visited = visited_flag
-        to_be_continue = func(self)
-        if not to_be_continue:
-            return
+        Args:
+            visited_flag: something tags visited nodes. (See _traverse)
 
-        for c in self.connections:
-            if isinstance(c, Node):
-                c._traverse(func, visited_flag)
+        Yields:
+            Node | Connection
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Connection):
+                yield node
+                if node.dst is not None:
+                    stack.append(node.dst)
+                continue
+
+            while isinstance(node, NodesGroup):
+                node = node.head
+
+            if node.__visited == visited_flag:
+                continue
+
+            node.__visited = visited_flag
+            to_be_continue = yield node
+            if to_be_continue is False:
+                continue
+
+            # reversed: the first connection is popped (visited) first
+            if node._connections:
+                stack.extend(c for c in reversed(node._connections) if c is not None)
 
     def connect(self, sub_node, direction='') -> None:
         """connect: self->sub_node
@@ -157,6 +272,54 @@ class Node(object):
             self.params[key] = value
 
 
+def fc_edge(src: Node, dst: Node, label=None, direction=None) -> str:
+    """fc_edge returns the flowchart.js connection string of an edge record:
+        "src_name(label, direction)->dst_name"
+
+    Returns:
+        str
+    """
+    specification = ', '.join(p for p in (label, direction) if p)
+    if specification:
+        specification = f'({specification})'
+    return f'{src.node_name}{specification}->{dst.node_name}\n'
+
+
+class Connection(object):
+    """Connection is a compact record of a labelled connection (edge): `src(label, direction)->dst`
+
+    It is not a Node: it has no name, no id, and no definition in flowchart.js.
+    A Connection with no dst yet is a dangling connection, which can be a tail of NodesGroup
+    (e.g. the no-path of an If without else) and be connected later.
+    """
+
+    __slots__ = ('src', 'dst', 'label', 'direction')
+
+    def __init__(self, src: Node, dst: Node = None, label: str = None, direction: str = None):
+        self.src = src
+        self.dst = dst
+        self.label = label
+        self.direction = direction
+
+    def edge(self) -> tuple:
+        """edge returns the record as a tuple: (src, dst, label, direction)"""
+        return self.src, self.dst, self.label, self.direction
+
+    def fc_connection(self) -> str:
+        if self.dst is not None:
+            return fc_edge(*self.edge())
+        return ""
+
+    def connect(self, sub_node, direction='') -> None:
+        """connect: src(label)->sub_node"""
+        if direction:
+            self.set_connect_direction(direction)
+        self.dst = sub_node
+
+    def set_connect_direction(self, connect_direction) -> None:
+        self.direction = connect_direction
+
+
 class NodesGroup(Node):
     """
     NodesGroup is a special node that can contain other nodes.
@@ -198,8 +361,8 @@ class NodesGroup(Node):
         self._refresh_fc()
         return self._fc_connections
 
-    def _traverse(self, func, visited_flag) -> None:
-        self.head._traverse(func, visited_flag)
+    def _traverse(self, func, visited_flag, connection_func=None) -> None:
+        self.head._traverse(func, visited_flag, connection_func)
 
     def _inner_traverse(self, func, visited_flag) -> None:
         """
@@ -214,10 +377,18 @@ class NodesGroup(Node):
         self.head._traverse(func_stop_at_tails, visited_flag)
 
     def connect(self, sub_node, direction='') -> None:
-        for t in self.tails:
-            if isinstance(t, Node):
-                if direction:
-                    t.set_connect_direction(direction)
+        # tails can be NodesGroups themselves (e.g. an If ending with an If):
+        # flatten them with an explicit stack instead of recursing into their connect().
+        stack = [(t, direction) for t in reversed(self.tails)]
+        while stack:
+            t, d = stack.pop()
+            if not isinstance(t, (Node, Connection)):
+                continue
+            if d:
+                t.set_connect_direction(d)
+            if type(t).connect is NodesGroup.connect:
+                stack.extend((tt, '') for tt in reversed(t.tails))
+            else:
                 t.connect(sub_node)
 
     def _clean_fc(self) -> None:
@@ -227,30 +398,59 @@ class NodesGroup(Node):
         self._fc_definitions = ''
         self._fc_connections = ''
 
-    def _add_node_fc(self, node: Node) -> bool:
-        """_add_node_fc visits a Node (in-group node), add it to NodesGroup.
+    def edge_table(self) -> Tuple[List[Node], List[tuple]]:
+        """edge_table walks the graph once, collecting every Node, and every edge
+        as a record (src, dst, label, direction), in the flowchart.js DSL order.
 
-        adds its fc_definition | fc_connection into self._fc_definitions | self._fc_connections.
+        Each Node is visited exactly once: NodesGroups are transparent to the traversal
+        (it goes straight to their head), so nested groups never re-walk their subgraph.
+
+        Returns:
+            (nodes, edges)
+        """
+        nodes, edges = [], []
+        for item in self._iter_table():
+            if isinstance(item, Node):
+                nodes.append(item)
+            else:
+                edges.append(item)
+        return nodes, edges
+
+    def _iter_table(self):
+        """_iter_table is a generator of edge_table: yields every Node and edge record, interleaved."""
+        for item in self._walk(next(Node._visited_flag)):
+            if isinstance(item, Node):
+                yield item
+                for c in item._connections or ():
+                    if isinstance(c, Node):  # labelled connections are yielded when the walk goes through them
+                        yield item, c, None, item.connect_direction
+            elif item.dst is not None:
+                yield item.edge()
+
+    def _emit_fc(self, definitions: list, connections: list) -> None:
+        """_emit_fc appends the fc_definition of every Node, and the fc connection of every edge,
+        into the given list buffers: a linear scan of the edge_table.
 
         Args:
-            node: visiting node
+            definitions: list<str> buffer for node definitions
+            connections: list<str> buffer for node connections
 
         Returns:
-            always True
+            None
         """
-        self._fc_definitions += node.fc_definition()
-        self._fc_connections += node.fc_connection()
-
-        return True
+        nodes, edges = self.edge_table()
+        definitions.extend(node.fc_definition() for node in nodes)
+        connections.extend(fc_edge(*edge) for edge in edges)
 
     def _refresh_fc(self) -> None:
         """
         refresh  _fc_definitions & _fc_connections
         """
-        self._clean_fc()
+        definitions, connections = [], []
+        self._emit_fc(definitions, connections)
 
-        visited_flag = f'{id(self)}-{time.time()}-{uuid.uuid4()}'
-        self._traverse(self._add_node_fc, visited_flag) # 访问所有节点，设置visited_flag?有啥用
+        self._fc_definitions = ''.join(definitions)
+        self._fc_connections = ''.join(connections)
 
     def simplify(self) -> None:
         """
@@ -270,6 +470,7 @@ class StartNode(Node):
     """StartNode is a Node subclass for flowchart.js `start` node
     """
     node_type = 'start'
+    __slots__ = ()
 
     def __init__(self, name: str):
         super().__init__()
@@ -281,6 +482,7 @@ class EndNode(Node):
     """EndNode is a Node subclass for flowchart.js `end` node
     """
     node_type = 'end'
+    __slots__ = ()
 
     def __init__(self, name: str):
         super().__init__()
@@ -292,6 +494,7 @@ class OperationNode(Node):
     """OperationNode is a Node subclass for flowchart.js `operation` node
     """
     node_type = 'operation'
+    __slots__ = ()
 
     def __init__(self, operation: str):
         super().__init__()
@@ -303,6 +506,7 @@ class InputOutputNode(Node):
     """InputOutputNode is a Node subclass for flowchart.js `inputoutput` node
     """
     node_type = 'inputoutput'
+    __slots__ = ()
 
     INPUT = 'input'
     OUTPUT = 'output'
@@ -317,6 +521,7 @@ class SubroutineNode(Node):
     """SubroutineNode is a Node subclass for flowchart.js `subroutine` node
     """
     node_type = 'subroutine'
+    __slots__ = ()
 
     def __init__(self, subroutine: str):
         super().__init__()
@@ -328,6 +533,7 @@ class ConditionNode(Node):
     """ConditionNode is a Node subclass for flowchart.js `condition` node
     """
     node_type = 'condition'
+    __slots__ = ('connection_yes', 'connection_no')
 
     def __init__(self, cond: str, align_next=True):
         """ConditionNode is a Node subclass for flowchart.js `condition` node.
@@ -372,46 +578,37 @@ class ConditionNode(Node):
         self.set_param('align-next', 'no')
 
 
-class CondYN(Node):
-    """CondYesNode is a Node subclass for flowchart.js `cond(yes|no)->sub`
+class CondYN(Connection):
+    """CondYN is a Connection for flowchart.js `cond(yes|no)->sub`
 
-    It is not a actual node in flowchart.js, but a middle connection.
+    It is not a actual node in flowchart.js, but a connection labelled yes|no.
     There are no definition ("node_name=>node_type: node_text") for CondYN.
     It just offers a connection ("cond(yes|no)->sub").
     """
 
+    __slots__ = ()
+
     YES = 'yes'
     NO = 'no'
 
     def __init__(self, cond: Node, yn: str, sub: Node = None):
-        """CondYesNode is a Node subclass for flowchart.js `cond(yes|no)->sub`
+        """CondYN is a Connection for flowchart.js `cond(yes|no)->sub`
 
         Args:
             cond: parent cond node
             yn: CondYN.YES or CondYN.NO
             sub: next_node, default None
         """
-        super().__init__()
+        super().__init__(cond, sub, yn)
 
-        self.cond = cond
-        self.yn = yn
-        self.sub = sub
+    @property
+    def cond(self) -> Node:
+        return self.src
 
-        if isinstance(sub, Node):
-            self.connections = [self.sub]
-
-    def fc_definition(self) -> str:
-        return ''
+    @property
+    def yn(self) -> str:
+        return self.label
 
-    def fc_connection(self) -> str:
-        if self.sub:
-            direction = f', {self.connect_direction}' if self.connect_direction else ""
-            specification = f'({self.yn}{direction})'
-            return f'{self.cond.node_name}{specification}->{self.sub.node_name}\n'
-        return ""
-
-    def connect(self, sub_node, direction='') -> None:
-        if direction:
-            self.set_connect_direction(direction)
-        self.connections.append(sub_node)
-        self.sub = sub_node
+    @property
+    def sub(self) -> Node:
+        return self.dst
@@ -0,0 +1,136 @@
+"""
+This file defines BuildProfile,
+which collects per-stage timings & node counts of conversions.
+
+Copyright 2020 CDFMLR. All rights reserved.
+Use of this source code is governed by a MIT
+license that can be found in the LICENSE file.
+"""
+
+import contextlib
+import contextvars
+import time
+
+# the BuildProfile of the running stage, for the sub-stages (text, simplify) deep in the build
+_active_profile = contextvars.ContextVar('pyflowchart_profile', default=None)
+
+
+def active_profile():
+    """active_profile returns the BuildProfile collecting the running conversion, or None."""
+    return _active_profile.get()
+
+
+class BuildProfile(object):
+    """
+    BuildProfile collects the time spent (and nodes made) by each stage of conversions:
+
+        - ast.parse:    parsing the source code (and indexing fields)
+        - build:        building the node graph (ast_node.parse), including:
+            - text:     generating node texts from the AST (astunparse)
+            - simplify: simplifying one-line-body If & Loop
+        - coalesce:     merging runs of plain operations (coalesce=N), nodes: the nodes removed
+        - passes:       applying simplify & conds_align to a base graph (FlowchartRenderer)
+        - stable_names: renaming nodes (stable_names=True)
+        - emission:     generating the flowchart DSL (Flowchart.flowchart / write)
+
+    Pass it to Flowchart.from_code(..., profile=profile), then read profile.stages or print profile.report().
+
+    Hooks (callables) registered by add_hook(hook) are called as hook(stage, seconds, nodes) at the end
+    of each stage; nodes is the number of nodes made by the stage, or None.
+    """
+
+    # stages nested in the build: reported by the build, at its end
+    sub_stages = ('text', 'simplify')
+
+    def __init__(self, hooks=None):
+        self.stages = {}  # stage -> {'seconds': float, 'calls': int, 'nodes': int}
+        self.hooks = list(hooks or [])
+
+    def add_hook(self, hook) -> None:
+        """add_hook registers hook(stage: str, seconds: float, nodes: Optional[int])"""
+        self.hooks.append(hook)
+
+    def add(self, stage: str, seconds: float, nodes=None, calls=1) -> None:
+        """add accumulates a measure into stage, without calling the hooks."""
+        s = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0, 'nodes': 0})
+        s['seconds'] += seconds
+        s['calls'] += calls
+        if nodes is not None:
+            s['nodes'] += nodes
+
+    def record(self, stage: str, seconds: float, nodes=None) -> None:
+        """record accumulates a measure into stage, and calls the hooks."""
+        self.add(stage, seconds, nodes)
+        for hook in self.hooks:
+            hook(stage, seconds, nodes)
+
+    @contextlib.contextmanager
+    def stage(self, stage: str):
+        """stage times the with-block as the given stage, and records it.
+
+        The profile is active (see active_profile) in the block,
+        and the sub-stages met in it are reported to the hooks at its end.
+
+            with profile.stage('build') as measure:
+                ...
+                measure['nodes'] = n  # optional
+
+        Args:
+            stage: str, name of the stage
+
+        Yields:
+            dict: set 'nodes' in it to record the number of nodes made by the stage
+        """
+        before = {s: dict(self.stages.get(s, {'seconds': 0.0, 'calls': 0})) for s in self.sub_stages}
+        measure = {'nodes': None}
+
+        token = _active_profile.set(self)
+        t = time.perf_counter()
+        try:
+            yield measure
+        finally:
+            seconds = time.perf_counter() - t
+            _active_profile.reset(token)
+
+            for s in self.sub_stages:
+                if s in self.stages and self.stages[s]['calls'] != before[s]['calls']:
+                    for hook in self.hooks:
+                        hook(s, self.stages[s]['seconds'] - before[s]['seconds'], None)
+
+            self.record(stage, seconds, measure['nodes'])
+
+    def seconds(self, stage: str) -> float:
+        """seconds returns the total time spent in stage"""
+        return self.stages.get(stage, {}).get('seconds', 0.0)
+
+    def report(self) -> str:
+        """report returns a per-stage breakdown table"""
+        build_self = self.seconds('build') - sum(self.seconds(s) for s in self.sub_stages)
+        rows = [
+            ('ast.parse', 'ast.parse'),
+            ('build', 'build (total)'),
+            ('text', '  text (astunparse)'),
+            ('simplify', '  simplify'),
+            (None, '  graph construction'),
+            ('coalesce', 'coalesce'),
+            ('passes', 'passes'),
+            ('stable_names', 'stable_names'),
+            ('emission', 'emission'),
+        ]
+        total = sum(self.seconds(s) for s in ('ast.parse', 'build', 'coalesce', 'passes', 'stable_names', 'emission'))
+
+        lines = [f'{"stage":<22}{"ms":>10}{"share":>8}{"calls":>8}{"nodes":>9}']
+        for stage, title in rows:
+            if stage is None:
+                if 'build' in self.stages:
+                    lines.append(f'{title:<22}{build_self * 1000:>10.2f}'
+                                 f'{build_self / total * 100 if total else 0:>7.1f}%')
+                continue
+            s = self.stages.get(stage)
+            if s is None:
+                continue
+            lines.append(f'{title:<22}{s["seconds"] * 1000:>10.2f}'
+                         f'{s["seconds"] / total * 100 if total else 0:>7.1f}%'
+                         f'{s["calls"]:>8}{s["nodes"] or "":>9}')
+        lines.append(f'{"total":<22}{total * 1000:>10.2f}')
+        return '\n'.join(lines)
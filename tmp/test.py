@@ -8,11 +8,19 @@ license that can be found in the LICENSE file.
 
 import _ast
 import ast
+import concurrent.futures
+import os
+import sys
+import tempfile
+import time
 
 import astunparse
 
 from pyflowchart.ast_node import *
 from pyflowchart.flowchart import *
+from pyflowchart.incremental import *
+from pyflowchart.profiling import *
+from pyflowchart.__main__ import batch_main, detect_decode, chardet_decode
 
 
 def flowchart_translate_test(name='流程图测试'):
@@ -210,6 +218,686 @@ while a < 4:
     print(flowchart.flowchart())
 
 
+def edge_table_test():
+    st = StartNode('edges')
+    cond = ConditionNode('cond')
+    op = OperationNode('op')
+    e = EndNode('edges')
+
+    st.connect(cond)
+    cond.connect_yes(op, direction='right')
+    cond.connect_no(e)
+    op.connect(e)
+
+    nodes, edges = Flowchart(st).edge_table()
+    assert nodes == [st, cond, op, e]
+    assert edges == [(st, cond, None, None),
+                     (cond, op, CondYN.YES, 'right'),
+                     (op, e, None, None),
+                     (cond, e, CondYN.NO, None)]
+    assert cond.connection_yes.sub is op and cond.connection_no.sub is e
+    print(Flowchart(st).flowchart())
+
+
+def stream_test():
+    import io
+    code = '\n'.join(f'if x > {i}:\n    x = {i}\nprint(x)' for i in range(3000))
+    flowchart = Flowchart.from_code(code)
+
+    buffer = io.StringIO()
+    flowchart.write(buffer, chunk_lines=100)
+    assert buffer.getvalue() == ''.join(flowchart.iter_lines()) == flowchart.flowchart()
+    print(f"stream_test: {len(buffer.getvalue())} chars OK")
+
+
+def incremental_test():
+    code = """
+def foo(a):
+    if a:
+        print(a)
+    a += 1
+
+class Bar:
+    def buzz(self, b):
+        for i in range(b):
+            print(i)
+
+print(foo(1))
+    """
+    edited = code.replace("print(a)", "print(a, 'edited')")
+
+    inc = IncrementalFlowchart()
+    inc.update(code)
+    flowchart = inc.update(edited)
+
+    # foo is rebuilt, Bar (and Bar.buzz in it) reused
+    assert inc.definitions.built == 1 and inc.definitions.reused == 1
+    expected = Flowchart.from_code(edited).flowchart()
+    assert "print(a, 'edited')" in flowchart.flowchart()
+    assert sorted(line.split('=>')[-1] for line in flowchart.flowchart().splitlines() if '=>' in line) == \
+           sorted(line.split('=>')[-1] for line in expected.splitlines() if '=>' in line)
+    assert flowchart.flowchart().count('->') == expected.count('->')
+    print(flowchart.flowchart())
+
+    # the same def moved out of (and into) a class body: reused, as a method only in the class
+    method = "class A:\n    def f(self): return 1\n"
+    nested = "def g():\n    def f(self): return 1\n    y = 3\n"
+    for before, after in [(method, nested), (nested, method)]:
+        inc = IncrementalFlowchart(stable_names=True)
+        inc.update(before)
+        assert inc.update(after).flowchart() == Flowchart.from_code(after, stable_names=True).flowchart()
+        assert inc.definitions.reused == 1
+
+
+def long_module_test(n=100000):
+    code = '\n'.join(f'x{i} = {i}' for i in range(n))
+    flow = Flowchart.from_code(code).flowchart()
+    # far more statements than the recursion limit
+    assert flow.count('=>operation: ') == n
+    assert flow.count('->') == n - 1
+    print(f"long_module_test: {n} statements OK")
+
+
+def deep_nesting_test(depth=500):
+    # the tokenizer allows at most 100 indentation levels, so nest the AST by hand
+    body = ast.parse('x = 0').body
+    for d in reversed(range(depth)):
+        level = ast.parse(f"""
+def f{d}(x):
+    if x > {d}:
+        x = {d}
+    while x:
+        print(x)
+        x -= 1
+""").body[0]
+        level.body.extend(body)
+        body = [level]
+
+    flow = Flowchart(parse(body).head).flowchart()
+    assert flow.count('=>start: ') == depth
+    assert flow.count('=>end: ') == depth
+    print(f"deep_nesting_test: {depth} levels OK")
+
+
+def deep_conditions_test(depth=500):
+    # if / for / while nested by hand (see deep_nesting_test)
+    body = ast.parse('x = 0').body
+    for d in reversed(range(depth)):
+        level = ast.parse(["if x > {d}:\n    pass",
+                           "for i{d} in range({d}):\n    pass",
+                           "while x < {d}:\n    pass"][d % 3].format(d=d)).body[0]
+        level.body = [ast.parse(f'x = {d}').body[0]] + body
+        body = [level]
+
+    flow = Flowchart(parse(body, simplify=False).head).flowchart()
+    assert flow.count('=>condition: ') == depth
+    # condition texts are the headers only
+    assert flow.split('=>condition: ', 1)[1].startswith('if (x > 0)\n')
+    print(f"deep_conditions_test: {depth} levels OK")
+
+
+def batch_test(jobs=2):
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'src')
+        os.makedirs(os.path.join(src, 'pkg'))
+        with open(os.path.join(src, 'pkg', 'a.py'), 'w') as f:
+            f.write("def foo(x):\n    print(x)\n\nclass Bar:\n    def buzz(self):\n        def g():\n            pass\n")
+        with open(os.path.join(src, 'b.py'), 'w') as f:
+            f.write("x = 1\nprint(x)\n")
+        with open(os.path.join(src, 'broken.py'), 'w') as f:
+            f.write("def (:\n")
+
+        out = os.path.join(tmp, 'out')
+        failures = batch_main([src], out, jobs=jobs, per_function=True)
+        written = sorted(os.path.relpath(os.path.join(d, f), out) for d, _, fs in os.walk(out) for f in fs)
+        print(written)
+        assert written == [os.path.join('pkg', 'a.py', n + '.flowchart') for n in ('Bar.buzz', 'Bar.buzz.g', 'foo')]
+        assert [os.path.basename(s) for s, _ in failures] == ['broken.py']
+
+        # globs & files are written at their paths relative to the current directory, '..' dropped
+        cwd = os.getcwd()
+        os.chdir(os.path.join(src, 'pkg'))
+        try:
+            failures = batch_main([os.path.join(os.pardir, '*.py')], os.path.join(tmp, 'out2'), jobs=jobs)
+            assert len(failures) == 1
+            with open(os.path.join(tmp, 'out2', 'b.py.flowchart')) as f:
+                assert 'x = 1' in f.read()
+
+            # ../b.py & b.py would write the same output: the second one is reported, not written
+            with open('b.py', 'w') as f:
+                f.write("y = 2\n")
+            failures = batch_main(['b.py', os.path.join(os.pardir, 'b.py')], os.path.join(tmp, 'out3'), jobs=jobs)
+            print(failures)
+            assert failures == [('b.py', f'output b.py already written for {os.path.join(os.pardir, "b.py")}')]
+            with open(os.path.join(tmp, 'out3', 'b.py.flowchart')) as f:
+                assert 'x = 1' in f.read()
+        finally:
+            os.chdir(cwd)
+    print("batch_test OK")
+
+
+def field_index_test():
+    code = """
+def foo():
+    pass
+
+class Bar():
+    def fuzz(self):
+        print('old fuzz')
+    def fuzz(self):
+        print('new fuzz')
+    def buzz(self, f):
+        def g(self):
+            f(self)
+        return g(self)
+
+Bar().buzz(foo)
+"""
+    code_ast = ast.parse(code)
+    dump = ast.dump(code_ast)
+
+    index = FieldIndex(code_ast)
+    print(sorted(index))
+    assert sorted(index) == ['', 'Bar', 'Bar.buzz', 'Bar.buzz.g', 'Bar.fuzz', 'foo']
+    assert index.functions() == ['foo', 'Bar.fuzz', 'Bar.buzz', 'Bar.buzz.g']
+    assert 'new fuzz' in astunparse.unparse(index['Bar.fuzz'])  # last wins
+
+    # not found: an empty body, the AST is not modified
+    assert Flowchart.find_field_from_ast(code_ast, 'Bar.nothing').body == []
+    assert Flowchart.find_field_from_ast(code_ast, 'Bar.buzz.g') is index['Bar.buzz.g']
+    assert ast.dump(code_ast) == dump
+
+    flowcharts = Flowchart.from_code_fields(code)
+    assert list(flowcharts) == index.functions()
+    for field, fc in flowcharts.items():
+        assert fc.flowchart().count('\n') == Flowchart.from_code(code, field=field).flowchart().count('\n')
+    print(flowcharts['Bar.fuzz'].flowchart())
+
+    # no such field: nothing to parse
+    for field in ['nope', 'Bar.nothing']:
+        try:
+            Flowchart.from_code(code, field=field)
+            assert False, field
+        except AssertionError as e:
+            assert str(e) == f"{field}: nothing to parse. Check given code and field please.", e
+    print("field_index_test OK")
+
+
+def cache_test():
+    code = "def foo(a):\n    if a:\n        print(a)\n    return a\n"
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FlowchartCache(tmp)
+        first = Flowchart.from_code(code, cache=cache).flowchart()
+        second = Flowchart.from_code(code, cache=cache).flowchart()
+        assert first == second  # byte-identical: read back from the cache
+        Flowchart.from_code(code, field='foo', cache=cache)
+        Flowchart.from_code(code, field='foo', simplify=True, cache=cache)
+        print(cache.report())
+        assert (cache.hits, cache.misses, cache.stores) == (1, 3, 3)
+
+        # another process (or run) shares the directory
+        assert FlowchartCache(tmp).get(FlowchartCache.key(code)) == first
+
+        # LRU eviction: the recently used entry is kept
+        new = "op1=>operation: x = 1\n\n"
+        small = FlowchartCache(tmp, max_bytes=len(first.encode()) + len(new))
+        for _, _, path in small._entries():
+            os.utime(path, (0, 0))
+        small.get(FlowchartCache.key(code))
+        small.put(FlowchartCache.key("x = 1\n"), new)
+        assert small.evictions == 2
+        assert small.get(FlowchartCache.key(code)) == first
+    print("cache_test OK")
+
+
+def concurrent_build_test(n_modules=200, threads=8):
+    codes = []
+    for m in range(n_modules):
+        lines = []
+        for f in range(m % 7 + 1):
+            lines += [f"def f{f}(a):",
+                      f"    for i in range({m}):",
+                      f"        if a > i + {f}:",
+                      f"            a = a - {f}",
+                      f"        else:",
+                      f"            print(a, {m})",
+                      f"    return a",
+                      f""]
+        lines.append(f"print(f0({m}))")
+        codes.append('\n'.join(lines) + '\n')
+
+    def convert(code):
+        return Flowchart.from_code(code).flowchart()
+
+    expected = [convert(code) for code in codes]
+    assert expected[0] == convert(codes[0])  # same input, same output, whatever ran before
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(convert, codes * 4))
+    finally:
+        sys.setswitchinterval(interval)
+
+    for i, flow in enumerate(results):
+        assert flow == expected[i % n_modules], codes[i % n_modules]
+        definitions, connections = flow.split('\n\n')
+        names = [line.split('=>')[0] for line in definitions.splitlines()]
+        assert len(names) == len(set(names))  # no name taken twice
+        for line in connections.splitlines():
+            for end in line.split('->'):
+                assert end.split('(')[0] in names
+    print(f"concurrent_build_test: {len(results)} builds in {threads} threads OK")
+
+
+def stable_names_test():
+    code = """x = 1
+def foo(a):
+    if a:
+        print(a)
+    for i in a:
+        pass
+    print(a)
+
+def bar(b):
+    while b > 0:
+        b -= 1
+    print(b)
+"""
+    flow = Flowchart.from_code(code, stable_names=True).flowchart()
+    print(flow)
+    assert 'foo.cond1_4=>condition: if a' in flow
+    assert 'bar.st->bar.io' in flow
+
+    # byte-identical, whatever was converted before
+    Flowchart.from_code(code + "y = 2\n")
+    assert Flowchart.from_code(code, stable_names=True).flowchart() == flow
+
+    # editing foo does not rename the nodes of bar
+    edited = code.replace("    print(a)\n", "    a += 1\n    print(a)\n")
+    edited_flow = Flowchart.from_code(edited, stable_names=True).flowchart()
+    assert [line for line in flow.splitlines() if line.startswith('bar.')] == \
+           [line for line in edited_flow.splitlines() if line.startswith('bar.')]
+
+    # incremental builds reuse subgraphs, and give the same names
+    inc = IncrementalFlowchart(stable_names=True)
+    inc.update(code)
+    assert inc.update(edited).flowchart() == edited_flow
+    print("stable_names_test OK")
+
+
+def profile_test():
+    code = "def foo(a):\n    for i in a:\n        print(i)\n    if a:\n        a = 1\n    print(a)\n"
+    calls = []
+    profile = BuildProfile(hooks=[lambda stage, seconds, nodes: calls.append((stage, nodes))])
+
+    fc = Flowchart.from_code(code, field='foo', inner=False, simplify=True, stable_names=True, profile=profile)
+    fc.flowchart()
+    print(profile.report())
+    print(calls)
+
+    assert [stage for stage, _ in calls] == ['ast.parse', 'text', 'simplify', 'build', 'stable_names', 'emission']
+    # all nodes allocated by the build, including NodesGroups & nodes replaced by the simplification
+    with node_id_scope() as ids:
+        Flowchart.from_code(code, field='foo', inner=False, simplify=True)
+        assert dict(calls)['build'] == next(ids)
+    assert profile.stages['simplify']['calls'] == 2
+    assert all(s['seconds'] > 0 for s in profile.stages.values())
+
+    # profiling measures only: the same flowchart (node names included) with and without a profile
+    for kwargs in [{}, {'simplify': True}, {'coalesce': 2}, {'max_depth': 1}]:
+        assert Flowchart.from_code(code, profile=BuildProfile(), **kwargs).flowchart() == \
+            Flowchart.from_code(code, **kwargs).flowchart(), kwargs
+    print("profile_test OK")
+
+
+def lean_test():
+    code = "x = 1\ndef foo(a):\n    for i in a:\n        print(i)\n    if a:\n        return a\n    print(a)\n"
+    flow = Flowchart.from_code(code, simplify=True, stable_names=True).flowchart()
+    fc = Flowchart.from_code(code, simplify=True, stable_names=True, lean=True)
+    assert fc.flowchart() == flow
+
+    spans = []
+
+    def check(node):
+        if hasattr(node, 'ast_object'):
+            assert not isinstance(node.ast_object, _ast.AST), node
+            spans.append(node.ast_object)
+        return True
+
+    fc._traverse(check, object())
+    print(spans)
+    assert (spans[0].lineno, spans[0].col_offset) == (1, 0)
+    print("lean_test OK")
+
+
+
+def simplify_before_build_test():
+    from pyflowchart.benchmark import node_count
+
+    code = "for i in a:\n    print(i)\nif a:\n    x = 1\nwhile a:\n    break\nprint(a)\n"
+    body = ast.parse(code).body
+
+    # decided by the AST: the simplified If & Loop are built directly
+    process = parse(body, simplify=True)
+    assert process.head.cond_node is None
+    assert process.head.head.node_text == 'print(i) while  i in a'
+    assert Loop.simplified(body[2]) is None  # break: not simplified
+
+    # the same flowchart as simplifying built If & Loop
+    built = [Loop(body[0], simplify=True), If(body[1], simplify=True)]
+    assert [n.head.node_text for n in built] == [process.head.head.node_text, 'x = 1 if  a']
+
+    allocated = {simplify: node_count(lambda: parse(body, simplify=simplify)) for simplify in (False, True)}
+    print(allocated)
+    assert allocated[True] < allocated[False]
+    print("simplify_before_build_test OK")
+
+
+def coalesce_test():
+    code = "x = 1\ny = 2\nz = x + y\nif z:\n    a = 1\n    b = 2\n    print(a)\nc = 3\nd = 4\ne = 5\nf = 6\n"
+
+    fc = Flowchart.from_code(code, coalesce=3)
+    print(fc.flowchart())
+    assert fc.coalesced == (11, 6)
+    nodes, edges = fc.edge_table()
+    # `c = 3` (entered from `print(a)` & `if z` no) starts a block
+    assert [n.node_text for n in nodes] == ['x = 1\ny = 2\nz = (x + y)', 'if z', 'a = 1\nb = 2', 'print(a)',
+                                            'c = 3\nd = 4\ne = 5', 'f = 6']
+    assert len(edges) == 6
+
+    # off by default, and blocks of 1 line are no blocks
+    assert Flowchart.from_code(code).coalesced is None
+    assert Flowchart.from_code(code, coalesce=1).flowchart() == Flowchart.from_code(code).flowchart()
+
+    print("coalesce_test OK")
+
+
+def elide_test():
+    assert elide_text('x = [1, 2, 3, 4]', max_chars=10) == 'x = [1,...'
+    assert elide_text('a\nb\nc', max_lines=2) == 'a\nb...'
+    assert elide_text('a\nb\nc', max_chars=4, max_lines=2) == 'a...'
+    assert elide_text('short', max_chars=10, max_lines=1) == 'short'
+
+    code = "TABLE = {'alpha': 1, 'beta': 2, 'gamma': 3, 'delta': 4}\nprint(TABLE)\na = 1\nb = 2\nc = 3\n"
+    options = dict(stable_names=True, coalesce=3, max_text_chars=30, max_text_lines=2)
+    fc = Flowchart.from_code(code, **options)
+    flow = fc.flowchart()
+    print(flow)
+    print(fc.full_texts)
+    assert "op1_0=>operation: TABLE = {'alpha': 1, 'beta'...\n" in flow
+    assert fc.full_texts['op1_0'] == "TABLE = {'alpha': 1, 'beta': 2, 'gamma': 3, 'delta': 4}"
+    assert "op3_0=>operation: a = 1\nb = 2...\n" in flow
+    assert fc.full_texts['op3_0'] == 'a = 1\nb = 2\nc = 3'
+    assert 'sub2_0' not in fc.full_texts  # within the budget
+
+    # deterministic
+    assert Flowchart.from_code(code, **options).flowchart() == flow
+    assert Flowchart.from_code(code).full_texts is None
+    print("elide_test OK")
+
+
+def block_stmts_test():
+    code = """
+class Foo(Base, metaclass=Meta):
+    def bar(self, a):
+        with open(a) as f, lock:
+            data = f.read()
+        try:
+            x = int(data)
+        except ValueError as e:
+            print(e)
+        except (KeyError, TypeError):
+            pass
+        else:
+            print(x)
+        finally:
+            close()
+        print(x)
+async def baz(q):
+    async with q as r:
+        async for i in r:
+            print(i)
+"""
+    fc = Flowchart.from_code(code, simplify=True)
+    flow = fc.flowchart()
+    print(flow)
+
+    nodes, edges = fc.edge_table()
+    texts = [n.node_text for n in nodes]
+    # headers only, bodies are parsed into nodes
+    for text in ['class Foo(Base, metaclass=Meta)', 'with open(a) as f, lock', 'data = f.read()',
+                 'except ValueError as e', 'except (KeyError, TypeError)', 'close()',
+                 'start baz', 'async with q as r', 'print(i) while async for i in r']:
+        assert text in texts, text
+    assert max(len(t) for t in texts) < 40
+
+    edge_texts = {(src.node_text, label, dst.node_text) for src, dst, label, _ in edges}
+    for src, label, dst in [('try', 'yes', 'x = int(data)'),
+                            ('x = int(data)', None, 'print(x)'),
+                            ('try', 'no', 'except ValueError as e'),
+                            ('except ValueError as e', 'no', 'except (KeyError, TypeError)'),
+                            ('except (KeyError, TypeError)', 'no', 'close()'),
+                            ('print(e)', None, 'close()'),
+                            ('pass', None, 'close()'),
+                            ('print(x)', None, 'close()')]:
+        assert (src, label, dst) in edge_texts, (src, label, dst)
+
+    # the except clauses & finally are entered from the try, whatever ends the try-body
+    flow = Flowchart.from_code("""
+def f():
+    try:
+        return g()
+    except ValueError:
+        log()
+    finally:
+        cleanup()
+""", field='f').flowchart()
+    print(flow)
+    for text in ['output:  g()', 'except ValueError', 'log()', 'cleanup()']:
+        assert text in flow, text
+    flow = Flowchart.from_code("for i in a:\n    try:\n        continue\n    except E:\n        break\n").flowchart()
+    assert 'except E' in flow and 'break' in flow
+
+    # a method returning does not cut the flow after the class off: it goes on from the start of the method
+    fc = Flowchart.from_code("""
+class A:
+    def m(self):
+        return 1
+with open(f) as fp:
+    x = 1
+main()
+""")
+    flow = fc.flowchart()
+    print(flow)
+    names = {n.node_text: n.node_name for n in fc.edge_table()[0]}
+    for text in ['start m', 'output:  1', 'with open(f) as fp', 'x = 1', 'main()']:
+        assert text in names, text
+    assert f"{names['start m']}->{names['with open(f) as fp']}" in flow
+
+    # classes are fields as before
+    assert Flowchart.from_code(code, field='Foo.bar').edge_table()[0][0].node_text == 'with open(a) as f, lock'
+    print("block_stmts_test OK")
+
+
+def detect_decode_test():
+    code = "def foo():\n    return '中文 café'\n"
+    cases = [
+        (code.encode('ascii', errors='replace'), code.encode('ascii', errors='replace').decode()),
+        (code.encode('utf-8'), code),
+        (code.encode('utf-8-sig'), code),  # BOMs
+        (code.encode('utf-16'), code),
+        (code.encode('utf-32'), code),
+        (('# -*- coding: gbk -*-\n' + code).encode('gbk'), '# -*- coding: gbk -*-\n' + code),  # cookie
+        (('# vim: set fileencoding=latin-1 :\n' + code.replace('中文 ', '')).encode('latin-1'),
+         '# vim: set fileencoding=latin-1 :\n' + code.replace('中文 ', '')),
+    ]
+    for content, expected in cases:
+        decoded = detect_decode(content)
+        print(repr(decoded))
+        assert decoded == expected, content
+
+    # the same as chardet over the whole content, where it decodes
+    for content, _ in cases[:4]:
+        assert detect_decode(content) == chardet_decode(content)
+
+    # an invalid cookie is ignored
+    assert detect_decode(b'# coding: no-such-codec\nx = 1\n') == '# coding: no-such-codec\nx = 1\n'
+
+    # long lines: the non-ASCII lines are sampled in linear time (quadratic in the line length before)
+    content = b'data = "' + b'x' * 200000 + b'"\n' + ('# café, déjà vu\n' * 200).encode('latin-1')
+    outcomes = []
+    for decode in (detect_decode, chardet_decode):
+        t = time.perf_counter()
+        try:
+            outcomes.append(decode(content))
+        except UnicodeDecodeError:  # chardet is not confident enough on latin-1: decoded as UTF-8
+            outcomes.append(UnicodeDecodeError)
+        assert time.perf_counter() - t < 1, f'{decode.__name__}: not linear'
+    assert outcomes[0] == outcomes[1]
+    print("detect_decode_test OK")
+
+
+def lazy_import_test():
+    import subprocess
+    from pyflowchart.benchmark import LAZY_MODULES
+
+    # a new interpreter: this one has imported them all already
+    check = (f"import sys, pyflowchart.__main__; "
+             f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+    eager = subprocess.run([sys.executable, '-c', check], stdout=subprocess.PIPE,
+                           universal_newlines=True, check=True).stdout.strip()
+    print(eager)
+    assert not eager, f'imported eagerly: {eager}'
+
+    # imported once needed
+    fc = Flowchart.from_code("x = 1\n")
+    assert 'astunparse' in sys.modules and 'x = 1' in fc.flowchart()
+    print("lazy_import_test OK")
+
+
+def renderer_test():
+    code = """
+def foo(a):
+    if a:
+        print(a)
+    if a > 1:
+        return 1
+    for x in a:
+        print(x)
+    while a:
+        if a:
+            break
+            continue
+    return 2
+"""
+    options = [(True, False), (False, True), (True, True), (False, False), (True, True)]
+
+    # the same flowcharts as converted again, but ast.parse & build run once
+    renderer = FlowchartRenderer(code, field='foo', stable_names=True)
+    for simplify, conds_align in options:
+        expected = Flowchart.from_code(code, field='foo', simplify=simplify, conds_align=conds_align,
+                                       stable_names=True).flowchart()
+        flow = renderer.flowchart(simplify, conds_align)
+        print(flow)
+        assert flow == expected, (simplify, conds_align)
+
+    # without stable names, the simplified nodes are named after their conditions
+    renderer = FlowchartRenderer(code, field='foo')
+    names = {n.node_text: n.node_name for n in renderer.render(simplify=True).edge_table()[0]}
+    assert names['print(a) if  a'].startswith('cond')
+    assert 'print(x) while  x in a' in renderer.flowchart(simplify=True)
+    flow = renderer.flowchart(simplify=False, conds_align=True)
+    assert 'print(a) if' not in flow and 'align-next=no' in flow and '(yes, right)' in flow
+    assert 'align-next=no' not in renderer.flowchart()
+
+    # from_code names them after their conditions as well
+    flow = Flowchart.from_code(code, field='foo', simplify=True).flowchart()
+    assert all(line.startswith('cond') for line in flow.splitlines() if '=>operation: print(' in line), flow
+    print("renderer_test OK")
+
+
+def collapse_test():
+    code = """
+def foo(a):
+    for x in a:
+        if x > 1:
+            while x:
+                x -= 1
+        else:
+            print(x)
+    try:
+        bar(a)
+    except ValueError:
+        if a:
+            print(a)
+    return a
+"""
+    # def: depth 1, for & try: depth 2 (collapsed), nothing in them is built or unparsed
+    profile = BuildProfile()
+    fc = Flowchart.from_code(code, field='foo', inner=False, max_depth=1, profile=profile)
+    flow = fc.flowchart()
+    print(flow)
+    assert 'for ... (6 lines, collapsed: 0.0)' in flow and 'try ... (5 lines, collapsed: 0.1)' in flow
+    assert 'x -= 1' not in flow and 'bar(a)' not in flow
+    assert profile.stages['text']['calls'] == 1  # return a
+    assert sorted(fc.collapse.collapsed) == ['0.0', '0.1']
+
+    # no limit reached: the flowchart as built without max_depth
+    assert Flowchart.from_code(code, field='foo', inner=False, max_depth=4).flowchart() == \
+        Flowchart.from_code(code, field='foo', inner=False).flowchart()
+
+    # expanding on demand gives the flowchart expanded up front, one level at a time
+    fc = Flowchart.from_code(code, field='foo', inner=False, max_depth=1, stable_names=True, conds_align=True)
+    expanded = []
+    for path, collapsed in [('0.1', ['0.0', '0.1.1.0']), ('0.1.1.0', ['0.0']), ('0.0', ['0.0.0']),
+                            ('0.0.0', ['0.0.0.0'])]:
+        fc.expand(path)
+        expanded.append(path)
+        expected = Flowchart.from_code(code, field='foo', inner=False, max_depth=1, stable_names=True,
+                                       conds_align=True, expand=expanded)
+        assert fc.flowchart() == expected.flowchart(), path
+        assert sorted(fc.collapse.collapsed) == collapsed, path
+
+    # all expanded: the full flowchart
+    fc.expand('0.0.0.0')
+    assert fc.flowchart() == Flowchart.from_code(code, field='foo', inner=False, stable_names=True,
+                                                 conds_align=True).flowchart()
+
+    # a path with no collapsed statement: KeyError both up front and on demand
+    for path in ['0', '0.1.1', '0.5', '0.0.0.0.0']:
+        try:
+            Flowchart.from_code(code, field='foo', inner=False, max_depth=1, expand=[path])
+            assert False, path
+        except KeyError as e:
+            assert e.args[0] == f'{path}: no collapsed statement at this path', e
+        try:
+            fc.expand(path)
+            assert False, path
+        except KeyError as e:
+            assert e.args[0] == f'{path}: no collapsed statement at this path', e
+
+    # the CLI: a bad path is reported before the output file is opened (see __main__)
+    import io
+    from pyflowchart.__main__ import main
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'foo.flowchart')
+        with open(output, 'w') as f:
+            f.write('kept')
+        try:
+            main(io.BytesIO(code.encode()), 'foo', False, False, False, output, max_depth=1, expand=['0.5'])
+            assert False
+        except CollapsedPathError:
+            pass
+        with open(output) as f:
+            assert f.read() == 'kept'
+        main(io.BytesIO(code.encode()), 'foo', False, False, False, output, max_depth=1, expand=['0.1'])
+        with open(output) as f:
+            assert f.read() == Flowchart.from_code(code, field='foo', inner=False, max_depth=1,
+                                                   expand=['0.1']).flowchart() + '\n'
+    print("collapse_test OK")
+
 if __name__ == '__main__':
     # flowchart_translate_test()
     # ast_unparser_test()
@@ -221,3 +909,24 @@ if __name__ == '__main__':
     # func_test()
     # from_code_test()
     simplify_on_off()
+    # edge_table_test()
+    # stream_test()
+    # incremental_test()
+    # long_module_test()
+    # deep_nesting_test()
+    # deep_conditions_test()
+    # batch_test()
+    # field_index_test()
+    # cache_test()
+    # concurrent_build_test()
+    # stable_names_test()
+    # profile_test()
+    # lean_test()
+    # simplify_before_build_test()
+    # coalesce_test()
+    # elide_test()
+    # block_stmts_test()
+    # detect_decode_test()
+    # lazy_import_test()
+    # renderer_test()
+    # collapse_test()